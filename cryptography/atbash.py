@@ -1,14 +1,15 @@
+import re
+
+from cipher_core import atbash
+from vigenere import ALPHABETS
+
 ciphertext = input()
 
-alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZÅÄÖ"
+# Characters not in the alphabet are left out, lower case letters included
+letters = ALPHABETS["finnish"]
+ciphertext = re.sub(f"[^{re.escape(letters)}]", "", ciphertext)
 
-plaintext = ""
-# I agree, the slowest method possible
-# Using a hash-table would be faster
-for letter in ciphertext:
-    for index, aakkonen in enumerate(alphabet):
-        if letter == aakkonen:
-            plaintext += alphabet[-(index+1)]
-            break
+# Translate table is built once, and str.translate does the rest
+plaintext = atbash(ciphertext)
 
 print(plaintext)
@@ -0,0 +1,235 @@
+""" Solver for Vigenère autokey ciphertexts. Kasiski examination doesn't work
+    against autokey, so keys are searched with hill climbing from random starting
+    keys, scoring the decryptions with n-gram log-probabilities
+"""
+from concurrent.futures import ProcessPoolExecutor
+import time
+
+import numpy as np
+
+from vigenere import Vigenere, alternating_row_sums
+from cryptanalysis import letter_probabilities
+
+class NgramScorer:
+    """ Scores text with n-gram log-probabilities. The table is indexed by the
+        n-gram's letter indices packed into one number, so scoring is a single
+        array lookup per n-gram
+    """
+    def __init__(self, table: np.ndarray, alphabet_length: int, length: int):
+        if len(table) != alphabet_length ** length:
+            raise ValueError("Table doesn't match alphabet and n-gram length")
+
+        self.table = table.astype(np.float32)
+        self.alphabet_length = alphabet_length
+        self.length = length
+
+    @classmethod
+    def from_text(cls, vigenere: Vigenere, text: str, length: int = 4):
+        """ Count n-grams of text, letters not in the alphabet are left out.
+            N-grams never seen get a probability a bit lower than seen once
+        """
+        n = len(vigenere.alphabet)
+        indices = vigenere.encode(vigenere.normalize(text), strict=False)
+        if len(indices) < length:
+            raise ValueError("Text is too short for n-gram statistics")
+
+        counts = np.bincount(cls._pack(indices, n, length), minlength=n ** length)
+        total = counts.sum()
+        table = np.log10(np.maximum(counts, 0.1) / total)
+
+        return cls(table, n, length)
+
+    @classmethod
+    def from_frequencies(cls, language: str, alphabet: str, length: int = 4):
+        """ N-gram log-probabilities from single letter frequencies, for when
+            there is no text to count n-grams from
+        """
+        log_probabilities = np.log10(letter_probabilities(language, alphabet))
+        table = np.zeros(1)
+        for _ in range(length):
+            table = np.add.outer(table, log_probabilities).ravel()
+
+        return cls(table, len(alphabet), length)
+
+    @classmethod
+    def load(cls, path: str):
+        """ Load table saved with save
+        """
+        with np.load(path) as saved:
+            return cls(saved["table"], int(saved["alphabet_length"]), int(saved["length"]))
+
+    def save(self, path: str) -> None:
+        """ Save table, so it doesn't have to be counted again
+        """
+        np.savez(path, table=self.table, alphabet_length=self.alphabet_length,
+                 length=self.length)
+
+    @staticmethod
+    def _pack(indices: np.ndarray, alphabet_length: int, length: int) -> np.ndarray:
+        """ Pack every n-gram along the last axis into one number
+        """
+        indices = indices.astype(np.int32, copy=False)
+        width = indices.shape[-1] - length + 1
+        packed = indices[..., :width].copy()
+        for offset in range(1, length):
+            packed *= alphabet_length
+            packed += indices[..., offset:offset + width]
+
+        return packed
+
+    def score(self, indices: np.ndarray) -> float:
+        """ Log-probability of text given as alphabet indices
+        """
+        return float(self.score_batch(indices[np.newaxis])[0])
+
+    def score_batch(self, indices: np.ndarray) -> np.ndarray:
+        """ Log-probabilities of many texts of the same length at once,
+            indices being an array of shape (texts, letters)
+        """
+        packed = self._pack(indices, self.alphabet_length, self.length)
+
+        # Summing with a matrix product is faster than sum for many short rows
+        return np.take(self.table, packed) @ np.ones(packed.shape[1], dtype=np.float32)
+
+def autokey_basis(ciphertext_indices: np.ndarray, key_length: int,
+                  alphabet_length: int) -> tuple[np.ndarray, np.ndarray]:
+    """ Autokey plaintext is p[i] = c[i] - p[i - key_length], so writing the text in
+        rows of key_length, every row is the ciphertext row minus the previous
+        plaintext row, the key being row -1. Unrolled, row r is
+            (-1)^r * (c[0] - c[1] + ... + (-1)^r * c[r]) - (-1)^r * key
+        Returns the first term and the sign (-1)^r of every letter, after which
+        plaintext for any key is (basis - sign * key[column]) % alphabet_length
+    """
+    # With a key of zeros, plaintext is the first term
+    basis = alternating_row_sums(ciphertext_indices, np.zeros(key_length, dtype=np.int64),
+                                 alphabet_length)
+    rows = np.arange(len(ciphertext_indices)) // key_length
+    signs = np.where(rows % 2 == 0, 1, -1).astype(np.int32)
+
+    return basis, signs
+
+def autokey_decrypt_batch(basis: np.ndarray, signs: np.ndarray, keys: np.ndarray,
+                          alphabet_length: int) -> np.ndarray:
+    """ Decrypt with many keys at once, keys being an array of shape
+        (keys, key_length). Returns an array of shape (keys, letters)
+    """
+    columns = np.arange(len(basis)) % keys.shape[1]
+
+    return (basis - signs * keys[:, columns]) % alphabet_length
+
+def hill_climb(ciphertext_indices: np.ndarray, key_length: int, scorer: NgramScorer,
+               seed: int, perturbations: int = 0) -> tuple[float, np.ndarray]:
+    """ Start from a random key and change one key letter at a time to the one
+        that scores best, until no single letter change improves the score.
+        All letters for one key position are scored as one batch.
+        Then perturbations times, change two random key letters at random and
+        climb again from there, keeping the new key if it scores better
+    """
+    n = scorer.alphabet_length
+    basis, signs = autokey_basis(ciphertext_indices, key_length, n)
+
+    rng = np.random.default_rng(seed)
+    best_score, key = _climb(basis, signs, rng.integers(0, n, key_length, dtype=np.int32),
+                             scorer, rng)
+
+    for _ in range(perturbations):
+        start = key.copy()
+        positions = rng.choice(key_length, min(2, key_length), replace=False)
+        start[positions] = rng.integers(0, n, len(positions))
+
+        score, new_key = _climb(basis, signs, start, scorer, rng)
+        if score > best_score + 1e-6:
+            best_score, key = score, new_key
+
+    return best_score, key
+
+def _climb(basis: np.ndarray, signs: np.ndarray, key: np.ndarray, scorer: NgramScorer,
+           rng: np.random.Generator) -> tuple[float, np.ndarray]:
+    """ Hill climb from key, a letter at a time, until it stops improving
+    """
+    n = scorer.alphabet_length
+    key_length = len(key)
+    best_score = -np.inf
+
+    improved = True
+    while improved:
+        improved = False
+        for position in rng.permutation(key_length):
+            candidates = np.repeat(key[np.newaxis], n, axis=0)
+            candidates[:, position] = np.arange(n)
+
+            scores = scorer.score_batch(autokey_decrypt_batch(basis, signs, candidates, n))
+            best = int(scores.argmax())
+            if scores[best] > best_score + 1e-6:
+                best_score = float(scores[best])
+                improved = improved or key[position] != best
+                key[position] = best
+
+    return best_score, key
+
+# Set in every worker process by _init_worker
+_ciphertext_indices: np.ndarray
+_scorer: NgramScorer
+
+def _init_worker(ciphertext_indices: np.ndarray, scorer: NgramScorer) -> None:
+    """ Give worker process the ciphertext and scorer once, instead of every task
+    """
+    global _ciphertext_indices, _scorer
+    _ciphertext_indices = ciphertext_indices
+    _scorer = scorer
+
+def _restart(key_length: int, seed: int, perturbations: int) -> tuple[float, np.ndarray]:
+    """ One hill climbing restart in worker process
+    """
+    return hill_climb(_ciphertext_indices, key_length, _scorer, seed, perturbations)
+
+def solve_autokey(vigenere: Vigenere, ciphertext: str, scorer: NgramScorer,
+                  key_lengths: range = range(1, 16), restarts: int = 10,
+                  perturbations: int = 4, processes: int = None,
+                  seed: int = 0) -> list[tuple[str, float]]:
+    """ Search autokey keys of every length in key_lengths, with restarts from
+        random keys for each length, every restart climbing again perturbations
+        times from a perturbed key. Restarts run in a process pool, or in this
+        process if processes is 0.
+        Returns (key, score) of the best key of every length, best first
+    """
+    if scorer.alphabet_length != len(vigenere.alphabet):
+        raise ValueError("Scorer is for a different alphabet")
+
+    ciphertext_indices = vigenere.encode(vigenere.normalize(ciphertext))
+    if len(ciphertext_indices) < scorer.length:
+        raise ValueError("Ciphertext is too short to analyse")
+
+    tasks = [(key_length, seed + restart, perturbations)
+             for key_length in key_lengths for restart in range(restarts)]
+
+    if processes == 0:
+        _init_worker(ciphertext_indices, scorer)
+        results = [_restart(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(ciphertext_indices, scorer)) as pool:
+            results = list(pool.map(_restart, *zip(*tasks)))
+
+    best = {}
+    for score, key in results:
+        if len(key) not in best or score > best[len(key)][1]:
+            best[len(key)] = (vigenere.decode(key), score)
+
+    return sorted(best.values(), key=lambda result: result[1], reverse=True)
+
+def benchmark_scoring(scorer: NgramScorer, text_length: int = 100,
+                      candidates: int = 100_000, batch_size: int = 10_000) -> float:
+    """ Measure how many candidate texts of text_length letters the scoring
+        kernel scores per second
+    """
+    rng = np.random.default_rng(0)
+    batch = rng.integers(0, scorer.alphabet_length, (batch_size, text_length), dtype=np.int32)
+
+    scored = 0
+    start = time.perf_counter()
+    while scored < candidates:
+        scorer.score_batch(batch)
+        scored += batch_size
+
+    return scored / (time.perf_counter() - start)
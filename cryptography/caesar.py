@@ -0,0 +1,39 @@
+""" Caesar cipher breaker. Every shift is scored at once from the letter counts,
+    and the candidates are ranked by chi-squared against letter frequencies,
+    best first
+"""
+import numpy as np
+
+from vigenere import Vigenere
+from cipher_core import affine_mapping
+from cryptanalysis import decryption_chi_squared, letter_probabilities, rank_decryptions
+
+def break_caesar(ciphertext: str, alphabet: str = "finnish",
+                 language: str = None) -> list[tuple[int, str, float]]:
+    """ Try every shift on ciphertext. Letters not in the alphabet are left out.
+        Returns (shift, plaintext, chi-squared) for every shift, best first
+    """
+    return break_caesar_batch([ciphertext], alphabet, language)[0]
+
+def break_caesar_batch(ciphertexts: list[str], alphabet: str = "finnish",
+                       language: str = None,
+                       top: int = None) -> list[list[tuple[int, str, float]]]:
+    """ Try every shift on many ciphertexts in one pass, language defaulting
+        to the alphabet's. Returns the top candidates of every ciphertext,
+        all of them if top is None
+    """
+    if language is None:
+        language = alphabet
+
+    vigenere = Vigenere(alphabet)
+    n = len(vigenere.alphabet)
+    probabilities = letter_probabilities(language, vigenere.alphabet)
+
+    encoded = [vigenere.encode(vigenere.normalize(ciphertext), strict=False)
+               for ciphertext in ciphertexts]
+
+    # Caesar cipher is affine cipher with a = 1, the shift being b
+    decrypting = affine_mapping(1, np.arange(n), n, decrypting=True)
+    chi_squared = decryption_chi_squared(encoded, n, decrypting, probabilities)
+
+    return rank_decryptions(vigenere, encoded, decrypting, chi_squared, top)
@@ -1,16 +1,7 @@
-ciphertext = input()
-
-alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZÅÄÖ"
+from caesar import break_caesar
 
-def decrypt(key, ciphertext):
-    plaintext = ""
-    for letter in ciphertext:
-        for index, aakkonen in enumerate(alphabet):
-            if letter == aakkonen:
-                plaintext += alphabet[(index + key)%len(alphabet)]
-                break    
-    
-    return plaintext
+ciphertext = input()
 
-for key in range(len(alphabet)):
-    print(len(alphabet) - (key), decrypt(key, ciphertext))
\ No newline at end of file
+# Most likely plaintexts first
+for shift, plaintext, _ in break_caesar(ciphertext):
+    print(shift, plaintext)
@@ -0,0 +1,124 @@
+""" Common core for the substitution ciphers of the course: Caesar, Atbash,
+    affine and Vigenère. Monoalphabetic ciphers are compiled into translate
+    tables, which are cached per alphabet and key, so encrypting is a single
+    str.translate call
+"""
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+
+from vigenere import ALPHABETS, Vigenere
+
+def modular_inverse(a: int, n: int) -> int:
+    """ Inverse of a modulo n, a and n must be coprime
+    """
+    if gcd(a, n) != 1:
+        raise ValueError(f"{a} has no inverse modulo {n}")
+
+    return pow(a, -1, n)
+
+def affine_mapping(a, b, alphabet_length: int, decrypting = False) -> np.ndarray:
+    """ Letter indices of affine cipher, letter x encrypting to a*x + b, or the
+        other way around when decrypting. With arrays of keys, returns an array
+        of shape (keys, alphabet_length)
+    """
+    n = alphabet_length
+    a, b = np.asarray(a), np.asarray(b)
+    if np.any(np.gcd(a, n) != 1):
+        raise ValueError(f"a must be coprime with {n}")
+
+    letters = np.arange(n)
+    if decrypting:
+        inverses = np.array([modular_inverse(unit, n) if gcd(unit, n) == 1 else 0
+                             for unit in range(n)])
+        return inverses[a % n][..., np.newaxis] * (letters - b[..., np.newaxis]) % n
+
+    return (a[..., np.newaxis] * letters + b[..., np.newaxis]) % n
+
+@lru_cache(maxsize=256)
+def _vigenere(alphabet: str) -> Vigenere:
+    """ One Vigenere per alphabet, so its lookup tables get built only once.
+        Alphabet is a registered name in any case, or else the letters themselves
+    """
+    if alphabet.lower() in ALPHABETS:
+        return Vigenere(alphabet)
+
+    return Vigenere(letters=alphabet)
+
+def _letters(alphabet: str) -> str:
+    """ Letters of the alphabet, resolved the same way for every cipher
+    """
+    return _vigenere(alphabet).alphabet
+
+@lru_cache(maxsize=256)
+def substitution_table(alphabet: str, substitutes: str, decrypting = False) -> dict[int, int]:
+    """ Translate table replacing every letter of the alphabet with the letter
+        in the same position of substitutes, or the other way around when decrypting
+    """
+    letters = _letters(alphabet)
+    if sorted(substitutes) != sorted(letters):
+        raise ValueError("Substitutes must have every letter of the alphabet once")
+
+    if decrypting:
+        return str.maketrans(substitutes, letters)
+
+    return str.maketrans(letters, substitutes)
+
+@lru_cache(maxsize=256)
+def affine_table(alphabet: str, a: int, b: int, decrypting = False) -> dict[int, int]:
+    """ Translate table for affine cipher, letter x encrypting to a*x + b
+    """
+    letters = _letters(alphabet)
+    substitutes = "".join(letters[x] for x in affine_mapping(a, b, len(letters)).tolist())
+
+    return substitution_table(alphabet, substitutes, decrypting)
+
+def shift_table(alphabet: str, shift: int) -> dict[int, int]:
+    """ Translate table for Caesar cipher, which is affine cipher with a = 1
+    """
+    return affine_table(alphabet, 1, shift % len(_letters(alphabet)))
+
+def atbash_table(alphabet: str) -> dict[int, int]:
+    """ Translate table for Atbash cipher, which is affine cipher with a = b = -1
+    """
+    letters = _letters(alphabet)
+
+    return affine_table(alphabet, len(letters) - 1, len(letters) - 1)
+
+def caesar_encrypt(text: str, shift: int, alphabet: str = "finnish") -> str:
+    """ Encrypt with Caesar cipher, letters not in the alphabet stay as they are
+    """
+    return _vigenere(alphabet).normalize(text).translate(shift_table(alphabet, shift))
+
+def caesar_decrypt(text: str, shift: int, alphabet: str = "finnish") -> str:
+    """ Decrypt Caesar cipher, letters not in the alphabet stay as they are
+    """
+    return _vigenere(alphabet).normalize(text).translate(shift_table(alphabet, -shift))
+
+def atbash(text: str, alphabet: str = "finnish") -> str:
+    """ Encrypt or decrypt with Atbash cipher, which are the same thing
+    """
+    return _vigenere(alphabet).normalize(text).translate(atbash_table(alphabet))
+
+def affine_encrypt(text: str, a: int, b: int, alphabet: str = "finnish") -> str:
+    """ Encrypt with affine cipher, a must be coprime with the alphabet length
+    """
+    return _vigenere(alphabet).normalize(text).translate(affine_table(alphabet, a, b))
+
+def affine_decrypt(text: str, a: int, b: int, alphabet: str = "finnish") -> str:
+    """ Decrypt affine cipher, a must be coprime with the alphabet length
+    """
+    table = affine_table(alphabet, a, b, decrypting=True)
+
+    return _vigenere(alphabet).normalize(text).translate(table)
+
+def vigenere_encrypt(text: str, key: str, alphabet: str = "finnish", autokey = False) -> str:
+    """ Encrypt with Vigenère cipher
+    """
+    return _vigenere(alphabet).encrypt(key, text, autokey)
+
+def vigenere_decrypt(text: str, key: str, alphabet: str = "finnish", autokey = False) -> str:
+    """ Decrypt Vigenère cipher
+    """
+    return _vigenere(alphabet).decrypt(key, text, autokey)
@@ -1,5 +1,7 @@
 import numpy as np
 
+from vigenere import Vigenere
+
 # Luodaan aakkoset
 aakkoset = "ABCDEFGHIJKLMNOPQRSTUVWXYZÅÄÖ"
 
@@ -15,4 +17,4 @@ muutetut_indeksit = (indeksit - siirros)%n
 
 # Tulostetaan selväkielen aakkoset ja salakielen korvaavat aakkoset
 print("Selväkieliaakkoset:", aakkoset)
-print("Salakieliaakkoset :", "".join([aakkoset[i] for i in muutetut_indeksit]))
+print("Salakieliaakkoset :", Vigenere("finnish").decode(muutetut_indeksit))
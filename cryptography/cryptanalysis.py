@@ -0,0 +1,212 @@
+""" Cryptanalysis of the Vigenère cipher: key length is estimated with Kasiski
+    examination and the index of coincidence, and every key letter is then
+    found with frequency analysis of its column
+"""
+import numpy as np
+
+from vigenere import Vigenere
+
+# Letter frequencies in percent
+LETTER_FREQUENCIES = {
+    "finnish": {
+        "A": 12.22, "B": 0.28, "C": 0.28, "D": 1.04, "E": 7.97, "F": 0.19,
+        "G": 0.39, "H": 1.85, "I": 10.82, "J": 2.04, "K": 4.97, "L": 5.76,
+        "M": 3.20, "N": 8.83, "O": 5.61, "P": 1.84, "Q": 0.013, "R": 2.87,
+        "S": 7.86, "T": 8.75, "U": 5.01, "V": 2.25, "W": 0.094, "X": 0.031,
+        "Y": 1.75, "Z": 0.051, "Å": 0.003, "Ä": 3.59, "Ö": 0.44,
+    },
+    "english": {
+        "A": 8.17, "B": 1.49, "C": 2.78, "D": 4.25, "E": 12.70, "F": 2.23,
+        "G": 2.02, "H": 6.09, "I": 6.97, "J": 0.15, "K": 0.77, "L": 4.03,
+        "M": 2.41, "N": 6.75, "O": 7.51, "P": 1.93, "Q": 0.10, "R": 5.99,
+        "S": 6.33, "T": 9.06, "U": 2.76, "V": 0.98, "W": 2.36, "X": 0.15,
+        "Y": 1.97, "Z": 0.07,
+    },
+}
+
+def letter_probabilities(language: str, alphabet: str) -> np.ndarray:
+    """ Letter probabilities of language in the order of alphabet. Letters the
+        language doesn't use get a small probability instead of zero, so that
+        they can be divided with
+    """
+    if language not in LETTER_FREQUENCIES:
+        raise ValueError(f"No letter frequencies for {language}")
+
+    frequencies = LETTER_FREQUENCIES[language]
+    probabilities = np.array([frequencies.get(letter, 0.0) for letter in alphabet])
+    if probabilities.sum() == 0:
+        raise ValueError(f"Letter frequencies of {language} have none of the alphabet's letters")
+
+    probabilities = np.maximum(probabilities / probabilities.sum(), 1e-4)
+
+    return probabilities / probabilities.sum()
+
+def alphabet_languages(alphabet: str) -> list[str]:
+    """ Languages with letter frequencies for letters of the alphabet
+    """
+    return [language for language, frequencies in LETTER_FREQUENCIES.items()
+            if any(letter in frequencies for letter in alphabet)]
+
+def column_counts(indices: np.ndarray, key_length: int, alphabet_length: int) -> np.ndarray:
+    """ Letter counts of every column, when text is written in rows of key_length.
+        Returns an array of shape (key_length, alphabet_length)
+    """
+    return np.stack([
+        np.bincount(indices[column::key_length], minlength=alphabet_length)
+        for column in range(key_length)
+    ])
+
+def index_of_coincidence(counts: np.ndarray) -> np.ndarray:
+    """ Index of coincidence of letter counts, along the last axis
+    """
+    totals = counts.sum(axis=-1)
+    pairs = (counts * (counts - 1)).sum(axis=-1)
+
+    return pairs / np.maximum(totals * (totals - 1), 1)
+
+def kasiski_distances(indices: np.ndarray, alphabet_length: int) -> np.ndarray:
+    """ Distances between consecutive occurrences of every repeated trigram
+    """
+    if len(indices) < 3:
+        return np.empty(0, dtype=np.int64)
+
+    n = alphabet_length
+    trigrams = (indices[:-2] * n + indices[1:-1]) * n + indices[2:]
+
+    # Stable sort keeps the positions of one trigram in ascending order
+    positions = np.argsort(trigrams, kind="stable")
+    repeated = trigrams[positions[1:]] == trigrams[positions[:-1]]
+    distances = positions[1:][repeated] - positions[:-1][repeated]
+
+    return distances
+
+def key_length_scores(indices: np.ndarray, alphabet_length: int, language: str,
+                      alphabet: str, max_key_length: int = 20,
+                      sample_size: int = 1_000_000) -> np.ndarray:
+    """ Score every key length from 1 to max_key_length, index 0 being length 1.
+        Score is the index of coincidence of the columns, scaled between random
+        text (0) and language (1), multiplied by how much more often Kasiski
+        distances are divisible by the length than by chance.
+        Only the first sample_size letters are used, which is plenty for statistics
+    """
+    indices = indices[:sample_size]
+    lengths = np.arange(1, max_key_length + 1)
+
+    random_ic = 1 / alphabet_length
+    language_ic = (letter_probabilities(language, alphabet) ** 2).sum()
+    ic_scores = np.array([
+        index_of_coincidence(column_counts(indices, length, alphabet_length)).mean()
+        for length in lengths
+    ])
+    ic_scores = np.clip((ic_scores - random_ic) / (language_ic - random_ic), 0, None)
+
+    distances = kasiski_distances(indices, alphabet_length)
+    if len(distances) == 0:
+        return ic_scores
+
+    # One length at a time, a (distances, lengths) matrix gets large for long texts
+    distances = distances.astype(np.int32)
+    divisible = np.array([np.count_nonzero(distances % length == 0)
+                          for length in lengths.tolist()]) / len(distances)
+
+    return ic_scores * divisible * lengths
+
+def estimate_key_length(indices: np.ndarray, alphabet_length: int, language: str,
+                        alphabet: str, max_key_length: int = 20) -> int:
+    """ Most likely key length. Multiples of the key length score about as well
+        as the key length itself, so the shortest one close to the best wins
+    """
+    scores = key_length_scores(indices, alphabet_length, language, alphabet, max_key_length)
+
+    return int(np.flatnonzero(scores >= 0.8 * scores.max())[0]) + 1
+
+def column_chi_squared(indices: np.ndarray, key_length: int, alphabet_length: int,
+                       probabilities: np.ndarray) -> np.ndarray:
+    """ Chi-squared against letter probabilities of every column decrypted with
+        every key letter. Returns an array of shape (key_length, alphabet_length)
+    """
+    n = alphabet_length
+    counts = column_counts(indices, key_length, n)
+    expected = counts.sum(axis=1)[:, np.newaxis, np.newaxis] * probabilities
+
+    # shifted[column, shift, letter] is the count of letter in column decrypted with shift
+    shifts = (np.arange(n)[:, np.newaxis] + np.arange(n)) % n
+    shifted = counts[:, shifts]
+
+    return ((shifted - expected) ** 2 / expected).sum(axis=2)
+
+def recover_key(indices: np.ndarray, key_length: int, alphabet_length: int,
+                probabilities: np.ndarray) -> tuple[np.ndarray, float]:
+    """ Find the key letter of every column with chi-squared against letter
+        probabilities. Returns the key indices and the total chi-squared
+    """
+    chi_squared = column_chi_squared(indices, key_length, alphabet_length, probabilities)
+    key = chi_squared.argmin(axis=1)
+
+    return key, float(chi_squared.min(axis=1).sum())
+
+def decryption_chi_squared(encoded: list[np.ndarray], alphabet_length: int,
+                           decrypting: np.ndarray, probabilities: np.ndarray) -> np.ndarray:
+    """ Chi-squared against letter probabilities of every text, given as alphabet
+        indices, decrypted with every monoalphabetic key. decrypting[key, y] is
+        the plaintext letter of ciphertext letter y. Returns an array of shape
+        (texts, keys)
+    """
+    n = alphabet_length
+    lengths = np.array([len(indices) for indices in encoded])
+    texts = np.repeat(np.arange(len(encoded)), lengths)
+    indices = np.concatenate(encoded + [np.empty(0, dtype=np.int64)])
+    counts = np.bincount(texts * n + indices, minlength=len(encoded) * n)
+    counts = counts.reshape(len(encoded), n)
+
+    # Chi-squared is sum(observed² / expected) - length, and with key k the
+    # plaintext letter of ciphertext letter y is decrypting[k, y], so
+    # sum(observed² / expected) of every key is one matrix product
+    weights = (1 / probabilities[decrypting]).T
+    safe_lengths = np.maximum(lengths, 1)[:, np.newaxis]
+
+    return (counts ** 2) @ weights / safe_lengths - lengths[:, np.newaxis]
+
+def rank_decryptions(vigenere: Vigenere, encoded: list[np.ndarray], decrypting: np.ndarray,
+                     chi_squared: np.ndarray,
+                     top: int = None) -> list[list[tuple[int, str, float]]]:
+    """ Keys of every text best first, as (key, plaintext, chi-squared), key
+        being the row of decrypting. Only the top keys, all of them if top is None
+    """
+    ranked = []
+    for text, indices in enumerate(encoded):
+        candidates = []
+        for key in np.argsort(chi_squared[text], kind="stable")[:top]:
+            candidates.append((int(key), vigenere.decode(decrypting[key][indices]),
+                               float(chi_squared[text, key])))
+        ranked.append(candidates)
+
+    return ranked
+
+def break_vigenere(vigenere: Vigenere, ciphertext: str, max_key_length: int = 20,
+                   languages: list[str] = None) -> list[tuple[str, str, float]]:
+    """ Break Vigenère ciphertext, trying every language. Letters not in the
+        alphabet are left out, like passthrough leaves them out of the key stream.
+        Returns (key, language, chi-squared) for every language, best first
+    """
+    if languages is None:
+        languages = alphabet_languages(vigenere.alphabet)
+        if not languages:
+            raise ValueError("No letter frequencies for the alphabet")
+
+    indices = vigenere.encode(vigenere.normalize(ciphertext), strict=False)
+    if len(indices) == 0:
+        raise ValueError("Nothing to analyse")
+
+    max_key_length = min(max_key_length, len(indices))
+    n = len(vigenere.alphabet)
+
+    results = []
+    for language in languages:
+        probabilities = letter_probabilities(language, vigenere.alphabet)
+        key_length = estimate_key_length(indices, n, language, vigenere.alphabet,
+                                         max_key_length)
+        key, chi_squared = recover_key(indices, key_length, n, probabilities)
+        results.append((vigenere.decode(key), language, chi_squared / len(indices)))
+
+    return sorted(results, key=lambda result: result[2])
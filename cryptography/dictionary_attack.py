@@ -0,0 +1,261 @@
+""" Dictionary attack on Vigenère keys. The wordlist is loaded into a compact
+    trie, and keys are built one letter at a time down the trie: every key letter
+    decrypts one column, so a partial key already has a score, and whole
+    subtrees of the trie that can't beat the best key found are pruned
+"""
+from concurrent.futures import ProcessPoolExecutor
+import heapq
+import multiprocessing
+import time
+
+import numpy as np
+
+from vigenere import ALPHABETS, Vigenere
+from cryptanalysis import LETTER_FREQUENCIES, column_chi_squared, letter_probabilities
+
+# Longest key looked for, word lengths are kept as bits of a 64-bit mask
+MAX_WORD_LENGTH = 63
+
+class Trie:
+    """ Trie of words as flat arrays. Edges of node are
+        edge_letters[edge_starts[node]:edge_starts[node + 1]], leading to the
+        nodes in edge_children. lengths[node] has bit l set, if a word of length l
+        ends in the subtree of node. Node 0 is the root
+    """
+    def __init__(self, letters: np.ndarray):
+        """ Letters holds a word per row as alphabet indices, padded with -1
+        """
+        if letters.size == 0:
+            raise ValueError("No usable words")
+
+        width = letters.shape[1]
+
+        # Sorted, words sharing a prefix are next to each other, and a word only
+        # adds the nodes past its common prefix with the previous word
+        letters = letters[np.lexsort(letters.T[::-1])]
+        letters = letters[np.concatenate(([True], (letters[1:] != letters[:-1]).any(axis=1)))]
+        word_lengths = (letters >= 0).sum(axis=1)
+        same = np.zeros_like(letters, dtype=bool)
+        same[1:] = (letters[1:] == letters[:-1]) & (letters[1:] >= 0)
+        common = np.cumprod(same, axis=1).sum(axis=1)
+
+        depths = np.arange(1, width + 1)
+        new = (depths > common[:, np.newaxis]) & (depths <= word_lengths[:, np.newaxis])
+        nodes = np.zeros(letters.shape, dtype=np.int64)
+        nodes[new] = np.arange(1, new.sum() + 1)
+
+        # Nodes of a common prefix are the previous word's, carried down the rows
+        latest = np.where(new, np.arange(len(letters))[:, np.newaxis], 0)
+        latest = np.maximum.accumulate(latest, axis=0)
+        nodes = np.take_along_axis(nodes, latest, axis=0)
+        nodes = np.hstack((np.zeros((len(letters), 1), dtype=np.int64), nodes))
+
+        node_count = int(new.sum()) + 1
+        children = nodes[:, 1:][new]
+        parents = nodes[:, :-1][new]
+        self.edge_starts = np.concatenate(([0], np.cumsum(np.bincount(
+            parents, minlength=node_count)))).astype(np.int64)
+
+        # Nodes are numbered in order, so sorting by parent keeps every node's
+        # children in letter order
+        order = np.argsort(parents, kind="stable")
+        self.edge_children = children[order]
+        self.edge_letters = letters[new][order]
+
+        ends = nodes[np.arange(len(letters)), word_lengths]
+        self.is_word = np.zeros(node_count, dtype=bool)
+        self.is_word[ends] = True
+
+        self.lengths = np.zeros(node_count, dtype=np.uint64)
+        on_path = depths <= word_lengths[:, np.newaxis]
+        bits = np.broadcast_to((np.uint64(1) << word_lengths.astype(np.uint64))[:, np.newaxis],
+                               on_path.shape)
+        np.bitwise_or.at(self.lengths, nodes[:, 1:][on_path], bits[on_path])
+        self.lengths[0] = np.bitwise_or.reduce(self.lengths[1:]) if node_count > 1 else 0
+
+        self.word_counts = np.bincount(word_lengths, minlength=MAX_WORD_LENGTH + 1)
+
+    @classmethod
+    def from_words(cls, words: list[np.ndarray]):
+        """ Trie of words given as arrays of alphabet indices. Empty words, and
+            words longer than MAX_WORD_LENGTH, are left out
+        """
+        words = [word for word in words if 0 < len(word) <= MAX_WORD_LENGTH]
+        width = max((len(word) for word in words), default=0)
+        letters = np.full((len(words), width), -1, dtype=np.int32)
+        for row, word in enumerate(words):
+            letters[row, :len(word)] = word
+
+        return cls(letters)
+
+    @classmethod
+    def from_file(cls, vigenere: Vigenere, path: str):
+        """ Load wordlist with a word per line. Words with letters not in the
+            alphabet, or longer than MAX_WORD_LENGTH, are left out. Raises
+            ValueError if that leaves no words
+        """
+        with open(path, encoding="utf-8") as wordlist:
+            words = vigenere.normalize(wordlist.read()).split()
+
+        # Look up every word at once, with a separator after each
+        codes, indices = vigenere.lookup("\n".join(words) + "\n")
+        ends = np.flatnonzero(codes == ord("\n"))
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        lengths = ends - starts
+
+        illegal = np.zeros(len(codes) + 1, dtype=np.int64)
+        np.cumsum(indices < 0, out=illegal[1:])
+        legal = (illegal[ends] - illegal[starts] == 0) & (lengths <= MAX_WORD_LENGTH)
+        starts, lengths = starts[legal], lengths[legal]
+
+        width = int(lengths.max(initial=0))
+        columns = np.arange(width)
+        letters = indices[np.minimum(starts[:, np.newaxis] + columns, len(indices) - 1)]
+        letters = np.where(columns < lengths[:, np.newaxis], letters, -1).astype(np.int32)
+
+        return cls(letters)
+
+    def children(self, nodes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Letters and child nodes of every node, and for every child the
+            position of its parent in nodes
+        """
+        starts = self.edge_starts[nodes]
+        counts = self.edge_starts[nodes + 1] - starts
+        parents = np.repeat(np.arange(len(nodes)), counts)
+        edges = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) \
+            + starts[parents]
+
+        return self.edge_letters[edges], self.edge_children[edges], parents
+
+def search(trie: Trie, scores: np.ndarray, letter: int, node: int, limit: float = np.inf,
+           keep: int = 10, stop=None) -> tuple[list[tuple[float, list[int]]], int]:
+    """ Best keys of length len(scores) starting with letter, node being the
+        letter's child of the root. scores[column, letter] is the chi-squared of
+        column decrypted with letter. The subtree is searched a level, that is a
+        key column, at a time, pruning keys whose score so far plus the best
+        possible score of the remaining columns isn't below limit.
+        Returns the keep best keys as (score, key indices) and the number of
+        nodes visited
+    """
+    key_length = len(scores)
+    length_bit = np.uint64(1) << np.uint64(key_length)
+    remaining = np.concatenate((np.cumsum(scores.min(axis=1)[::-1])[::-1], [0.0]))
+
+    nodes = np.array([node])
+    keys = np.array([[letter]])
+    key_scores = np.array([scores[0, letter]])
+    visited = 1
+    for depth in range(1, key_length):
+        if stop is not None and stop.is_set() or len(nodes) == 0:
+            return [], visited
+
+        letters, nodes, parents = trie.children(nodes)
+        visited += len(nodes)
+        key_scores = key_scores[parents] + scores[depth, letters]
+        alive = ((trie.lengths[nodes] & length_bit) != 0) \
+            & (key_scores + remaining[depth + 1] < limit)
+
+        nodes, key_scores = nodes[alive], key_scores[alive]
+        keys = np.hstack((keys[parents[alive]], letters[alive, np.newaxis]))
+
+    words = trie.is_word[nodes]
+    key_scores, keys = key_scores[words], keys[words]
+    best = np.argsort(key_scores, kind="stable")[:keep]
+
+    return [(float(key_scores[row]), keys[row].tolist()) for row in best], visited
+
+# Set in every worker process by _init_worker
+_trie: Trie
+_scores: dict[int, np.ndarray]
+_stop = None
+_stop_below: float = None
+_letters: int
+# Score of the keep-th best key found so far by the worker for every key length,
+# keys can't get into the results without beating it
+_limits: dict[int, list[float]]
+
+def _init_worker(trie: Trie, scores: dict[int, np.ndarray], stop, stop_below: float,
+                 letters: int) -> None:
+    """ Give worker process the trie and column scores once, instead of every task
+    """
+    global _trie, _scores, _stop, _stop_below, _letters, _limits
+    _trie, _scores, _stop, _stop_below, _letters = trie, scores, stop, stop_below, letters
+    _limits = {}
+
+def _search_task(key_length: int, letter: int, node: int,
+                 keep: int) -> tuple[list[tuple[float, list[int]]], int]:
+    """ Search the subtree of the first key letter, and raise the stop flag if a
+        key is good enough
+    """
+    if _stop.is_set():
+        return [], 0
+
+    found = _limits.setdefault(key_length, [])
+    limit = found[keep - 1] if len(found) >= keep else np.inf
+    results, visited = search(_trie, _scores[key_length], letter, node, limit, keep, _stop)
+    found[:] = sorted(found + [score for score, _ in results])[:keep]
+
+    if _stop_below is not None and results and results[0][0] / _letters < _stop_below:
+        _stop.set()
+
+    return results, visited
+
+def dictionary_attack(vigenere: Vigenere, ciphertext: str, trie: Trie, language: str = None,
+                      keep: int = 10, processes: int = None,
+                      stop_below: float = None) -> tuple[list[tuple[str, float]], dict]:
+    """ Find the dictionary words that decrypt ciphertext best, scored by
+        chi-squared per letter against language, the alphabet's by default.
+        Subtrees run in a process pool, or in this process if processes is 0.
+        When a key scoring below stop_below is found, every worker stops early.
+        Returns the keep best (key, score) and statistics with candidates per second
+    """
+    if language is None:
+        language = next((name for name in LETTER_FREQUENCIES
+                         if ALPHABETS.get(name) == vigenere.alphabet), "english")
+    probabilities = letter_probabilities(language, vigenere.alphabet)
+
+    # Letters not in the alphabet, passed through in encryption, are left out
+    indices = vigenere.encode(vigenere.normalize(ciphertext), strict=False)
+    if len(indices) == 0:
+        raise ValueError("Nothing to analyse")
+
+    n = len(vigenere.alphabet)
+    key_lengths = [length for length in np.flatnonzero(trie.word_counts).tolist()
+                   if length <= len(indices)]
+    scores = {length: column_chi_squared(indices, length, n, probabilities)
+              for length in key_lengths}
+    if not key_lengths:
+        raise ValueError("No words short enough for the ciphertext")
+
+    root_letters, root_children, _ = trie.children(np.zeros(1, dtype=np.int64))
+    tasks = [(length, letter, child, keep) for length in key_lengths
+             for letter, child in zip(root_letters.tolist(), root_children.tolist())]
+
+    # Workers get the flag when they start, and any of them can raise it
+    stop = multiprocessing.Event()
+
+    start = time.perf_counter()
+    if processes == 0:
+        _init_worker(trie, scores, stop, stop_below, len(indices))
+        results = [_search_task(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(trie, scores, stop, stop_below,
+                                           len(indices))) as pool:
+            results = list(pool.map(_search_task, *zip(*tasks)))
+    elapsed = time.perf_counter() - start
+
+    best = heapq.nsmallest(keep, (result for task_results, _ in results
+                                  for result in task_results))
+    candidates = int(trie.word_counts[key_lengths].sum())
+
+    statistics = {
+        "candidates": candidates,
+        "nodes_visited": sum(visited for _, visited in results),
+        "seconds": elapsed,
+        "candidates_per_second": candidates / elapsed if elapsed > 0 else float("inf"),
+        "stopped_early": stop.is_set(),
+    }
+
+    return [(vigenere.decode(np.array(key)), score / len(indices)) for score, key in best], \
+        statistics
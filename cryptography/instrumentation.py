@@ -0,0 +1,206 @@
+""" Opt-in instrumentation of the cipher operations. Counts calls, bytes and
+    wall and CPU time per operation and alphabet, and can profile the next calls.
+    Methods are only wrapped while instrumentation is enabled, so when it's off
+    the original methods run untouched
+"""
+from contextlib import contextmanager
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+
+from vigenere import ALPHABETS, Vigenere
+
+# Statistics of every (operation, alphabet)
+_stats: dict[tuple[str, str], dict[str, float]] = {}
+_lock = threading.Lock()
+
+# Wrapped methods as (owner, name) -> original
+_originals: dict[tuple[type, str], object] = {}
+
+_profiler: cProfile.Profile = None
+_profile_calls = 0
+_profile_path: str = None
+# Whether a call is being profiled, in any thread. cProfile profiles one
+# thread at a time, so calls of other threads meanwhile aren't profiled
+_profiling = False
+
+def alphabet_name(letters: str) -> str:
+    """ Name letters are registered with, or the letters themselves
+    """
+    return next((name for name, alphabet in ALPHABETS.items() if alphabet == letters), letters)
+
+def size_in_bytes(data) -> int:
+    """ Size of text as UTF-8, or of bytes-like data
+    """
+    if isinstance(data, str):
+        return len(data) if data.isascii() else len(data.encode("utf-8"))
+
+    return memoryview(data).nbytes
+
+def add(operation: str, alphabet: str, size: int, wall: float, cpu: float) -> None:
+    """ Add one call to the statistics of operation and alphabet
+    """
+    with _lock:
+        stats = _stats.setdefault((operation, alphabet),
+                                  {"calls": 0, "bytes": 0, "wall_seconds": 0.0,
+                                   "cpu_seconds": 0.0})
+        stats["calls"] += 1
+        stats["bytes"] += size
+        stats["wall_seconds"] += wall
+        stats["cpu_seconds"] += cpu
+
+@contextmanager
+def record(operation: str, alphabet: str = "", size: int = 0):
+    """ Record the block as one call of operation. CPU time is of the calling thread
+    """
+    profiler = _start_profile()
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        add(operation, alphabet, size, time.perf_counter() - wall, time.thread_time() - cpu)
+        if profiler is not None:
+            _stop_profile(profiler)
+
+def instrument(owner: type, name: str, operation: str = None, alphabet=None, size=None) -> None:
+    """ Wrap method name of owner to record its calls. Alphabet and size are
+        functions of the call's arguments, self included
+    """
+    if (owner, name) in _originals:
+        return
+
+    original = getattr(owner, name)
+    operation = operation or name
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        with record(operation, alphabet(*args, **kwargs) if alphabet else "",
+                    size(*args, **kwargs) if size else 0):
+            return original(*args, **kwargs)
+
+    _originals[(owner, name)] = original
+    setattr(owner, name, wrapper)
+
+def _vigenere_alphabet(vigenere: Vigenere, *_, **__) -> str:
+    """ Alphabet of a Vigenere method call
+    """
+    return alphabet_name(vigenere.alphabet)
+
+def _text_size(_, key = None, text = None, *__, **kwargs) -> int:
+    """ Size of the text or data of a Vigenere method call
+    """
+    if text is None:
+        text = next(kwargs[name] for name in ("plaintext", "ciphertext", "data")
+                    if name in kwargs)
+
+    return size_in_bytes(text)
+
+def enable() -> None:
+    """ Start recording Vigenère encryption and decryption
+    """
+    for name in ("encrypt", "decrypt", "encrypt_bytes", "decrypt_bytes"):
+        instrument(Vigenere, name, alphabet=_vigenere_alphabet, size=_text_size)
+
+def disable() -> None:
+    """ Put every wrapped method back as it was. Statistics are kept
+    """
+    for (owner, name), original in _originals.items():
+        setattr(owner, name, original)
+    _originals.clear()
+
+def enabled() -> bool:
+    """ Whether any method is instrumented
+    """
+    return bool(_originals)
+
+def reset() -> None:
+    """ Forget statistics
+    """
+    with _lock:
+        _stats.clear()
+
+def profile_next(calls: int, path: str = None) -> None:
+    """ Profile the next calls recorded calls with cProfile, writing the
+        statistics to path afterwards if given. Calls inside a profiled call
+        are part of it
+    """
+    global _profiler, _profile_calls, _profile_path
+    with _lock:
+        _profiler = cProfile.Profile()
+        _profile_calls = calls
+        _profile_path = path
+
+def _start_profile() -> cProfile.Profile:
+    """ Start profiling the call beginning, if profiling is asked for and no
+        call in any thread is profiled yet. Returns the profiler started, or None
+    """
+    global _profile_calls, _profiling
+    if _profile_calls <= 0:
+        return None
+
+    with _lock:
+        if _profile_calls <= 0 or _profiling:
+            return None
+        _profile_calls -= 1
+        _profiling = True
+        profiler = _profiler
+        profiler.enable()
+
+    return profiler
+
+def _stop_profile(profiler: cProfile.Profile) -> None:
+    """ Stop profiling the call ended, and save the profile after the last one
+    """
+    global _profiling
+    with _lock:
+        profiler.disable()
+        _profiling = False
+        if _profile_calls == 0 and profiler is _profiler and _profile_path is not None:
+            profiler.dump_stats(_profile_path)
+
+def profile_report(limit: int = 20) -> str:
+    """ Most time consuming functions of the profiled calls
+    """
+    if _profiler is None:
+        return ""
+
+    output = io.StringIO()
+    pstats.Stats(_profiler, stream=output).sort_stats("cumulative").print_stats(limit)
+
+    return output.getvalue()
+
+def snapshot() -> dict:
+    """ Statistics as {operation: {alphabet: {calls, bytes, wall_seconds, cpu_seconds}}}
+    """
+    with _lock:
+        result = {}
+        for (operation, alphabet), stats in _stats.items():
+            result.setdefault(operation, {})[alphabet] = dict(stats)
+
+    return result
+
+def prometheus(prefix: str = "cipher") -> str:
+    """ Statistics in Prometheus text exposition format
+    """
+    metrics = [
+        ("calls", "calls_total", "Calls of the operation"),
+        ("bytes", "bytes_total", "Bytes processed by the operation"),
+        ("wall_seconds", "wall_seconds_total", "Wall clock time spent in the operation"),
+        ("cpu_seconds", "cpu_seconds_total", "CPU time of the calling thread in the operation"),
+    ]
+    stats = snapshot()
+
+    lines = []
+    for key, metric, description in metrics:
+        lines.append(f"# HELP {prefix}_{metric} {description}")
+        lines.append(f"# TYPE {prefix}_{metric} counter")
+        for operation, alphabets in stats.items():
+            for alphabet, values in alphabets.items():
+                alphabet = alphabet.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{prefix}_{metric}{{operation="{operation}",'
+                             f'alphabet="{alphabet}"}} {values[key]}')
+
+    return "\n".join(lines) + "\n"
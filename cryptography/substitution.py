@@ -0,0 +1,137 @@
+""" Affine and general substitution ciphers over many messages at once. Like in
+    course_example, a cipher alphabet is an array of indices, here a permutation
+    of the alphabet indices, and every message is encrypted with one array lookup
+    on all the messages joined together
+"""
+import numpy as np
+
+from vigenere import Vigenere
+from cipher_core import affine_mapping
+from cryptanalysis import decryption_chi_squared, letter_probabilities, rank_decryptions
+
+def affine_keys(alphabet_length: int) -> tuple[np.ndarray, np.ndarray]:
+    """ Every valid affine key (a, b), a being coprime with the alphabet length
+    """
+    n = alphabet_length
+    units = np.flatnonzero(np.gcd(np.arange(n), n) == 1)
+
+    return np.repeat(units, n), np.tile(np.arange(n), len(units))
+
+def substitute_permutation(vigenere: Vigenere, substitutes: str) -> np.ndarray:
+    """ Cipher alphabet replacing every letter of the alphabet with the letter
+        in the same position of substitutes
+    """
+    permutation = vigenere.encode(vigenere.normalize(substitutes))
+    if len(permutation) != len(vigenere.alphabet) \
+            or np.any(np.sort(permutation) != np.arange(len(vigenere.alphabet))):
+        raise ValueError("Substitutes must have every letter of the alphabet once")
+
+    return permutation
+
+def invert_permutations(permutations: np.ndarray) -> np.ndarray:
+    """ Decrypting cipher alphabets of encrypting ones, along the last axis
+    """
+    return np.argsort(permutations, axis=-1)
+
+def substitute_many(vigenere: Vigenere, messages: list[str],
+                    permutations: np.ndarray) -> list[str]:
+    """ Replace every letter of every message through its cipher alphabet.
+        Permutations is one cipher alphabet for every message, or an array of
+        shape (messages, alphabet length). Letters not in the alphabet stay as they are
+    """
+    permutations = np.asarray(permutations)
+    messages = [vigenere.normalize(message) for message in messages]
+    lengths = np.array([len(message) for message in messages], dtype=np.int64)
+
+    codes, indices = vigenere.lookup("".join(messages))
+    letters = np.flatnonzero(indices >= 0)
+    if permutations.ndim == 1:
+        substituted = permutations[indices[letters]]
+    else:
+        rows = np.repeat(np.arange(len(messages)), lengths)[letters]
+        substituted = permutations[rows, indices[letters]]
+
+    codes = codes.copy()
+    codes[letters] = np.frombuffer(vigenere.alphabet.encode("utf-32-le"),
+                                   dtype=np.uint32)[substituted]
+    text = codes.tobytes().decode("utf-32-le")
+
+    ends = np.cumsum(lengths).tolist()
+    return [text[end - length:end] for end, length in zip(ends, lengths.tolist())]
+
+def affine_encrypt_many(messages: list[str], a, b, alphabet: str = "finnish") -> list[str]:
+    """ Encrypt messages with affine cipher, with one key for all or a and b
+        being arrays of a key for every message
+    """
+    vigenere = Vigenere(alphabet)
+    permutations = affine_mapping(a, b, len(vigenere.alphabet))
+
+    return substitute_many(vigenere, messages, permutations)
+
+def affine_decrypt_many(messages: list[str], a, b, alphabet: str = "finnish") -> list[str]:
+    """ Decrypt messages with affine cipher, with one key for all or a and b
+        being arrays of a key for every message
+    """
+    vigenere = Vigenere(alphabet)
+    permutations = affine_mapping(a, b, len(vigenere.alphabet), decrypting=True)
+
+    return substitute_many(vigenere, messages, permutations)
+
+def substitution_encrypt_many(messages: list[str], substitutes,
+                              alphabet: str = "finnish") -> list[str]:
+    """ Encrypt messages with substitution cipher, substitutes being the cipher
+        alphabet of all messages or a list of one for every message
+    """
+    vigenere = Vigenere(alphabet)
+    permutations = _permutations(vigenere, substitutes)
+
+    return substitute_many(vigenere, messages, permutations)
+
+def substitution_decrypt_many(messages: list[str], substitutes,
+                              alphabet: str = "finnish") -> list[str]:
+    """ Decrypt messages with substitution cipher, substitutes being the cipher
+        alphabet of all messages or a list of one for every message
+    """
+    vigenere = Vigenere(alphabet)
+    permutations = invert_permutations(_permutations(vigenere, substitutes))
+
+    return substitute_many(vigenere, messages, permutations)
+
+def _permutations(vigenere: Vigenere, substitutes) -> np.ndarray:
+    """ Cipher alphabet of substitutes, or cipher alphabets of a list of them
+    """
+    if isinstance(substitutes, str):
+        return substitute_permutation(vigenere, substitutes)
+
+    return np.stack([substitute_permutation(vigenere, letters) for letters in substitutes])
+
+def break_affine(ciphertext: str, alphabet: str = "finnish",
+                 language: str = None) -> list[tuple[int, int, str, float]]:
+    """ Try every affine key on ciphertext. Letters not in the alphabet are left out.
+        Returns (a, b, plaintext, chi-squared) for every key, best first
+    """
+    return break_affine_batch([ciphertext], alphabet, language)[0]
+
+def break_affine_batch(ciphertexts: list[str], alphabet: str = "finnish",
+                       language: str = None,
+                       top: int = None) -> list[list[tuple[int, int, str, float]]]:
+    """ Try every affine key on many ciphertexts at once, language defaulting
+        to the alphabet's. Returns the top candidates of every ciphertext,
+        all of them if top is None
+    """
+    if language is None:
+        language = alphabet
+
+    vigenere = Vigenere(alphabet)
+    n = len(vigenere.alphabet)
+    probabilities = letter_probabilities(language, vigenere.alphabet)
+
+    encoded = [vigenere.encode(vigenere.normalize(ciphertext), strict=False)
+               for ciphertext in ciphertexts]
+
+    a, b = affine_keys(n)
+    decrypting = affine_mapping(a, b, n, decrypting=True)
+    chi_squared = decryption_chi_squared(encoded, n, decrypting, probabilities)
+
+    return [[(int(a[key]), int(b[key]), plaintext, score) for key, plaintext, score in candidates]
+            for candidates in rank_decryptions(vigenere, encoded, decrypting, chi_squared, top)]
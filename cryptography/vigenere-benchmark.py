@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+""" Throughput benchmarks for the cryptography code, results as JSON so that
+    they can be compared between commits
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from vigenere import ALPHABETS, Vigenere
+from caesar import break_caesar
+from cryptanalysis import LETTER_FREQUENCIES
+from cipher_core import atbash
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000]
+
+def random_text(alphabet: str, length: int, seed: int) -> str:
+    """ Deterministic random text of length letters
+    """
+    vigenere = Vigenere(alphabet)
+    rng = np.random.default_rng(seed)
+
+    return vigenere.decode(rng.integers(0, len(vigenere.alphabet), length))
+
+def measure(function, repeats: int) -> dict:
+    """ Call function repeats times, and once more under tracemalloc for peak memory
+    """
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "latency_p50": float(np.percentile(latencies, 50)),
+        "latency_p90": float(np.percentile(latencies, 90)),
+        "latency_p99": float(np.percentile(latencies, 99)),
+        "peak_memory": peak,
+    }
+
+def cases(args) -> list:
+    """ Every benchmark as (name, alphabet, key length, autokey, max size, function
+        of text and key)
+    """
+    vigeneres = {alphabet: Vigenere(alphabet) for alphabet in args.alphabets}
+
+    benchmarks = []
+    for alphabet, vigenere in vigeneres.items():
+        for key_length in args.key_lengths:
+            for autokey in args.autokey:
+                benchmarks.append((
+                    "vigenere_encrypt", alphabet, key_length, autokey, args.max_size,
+                    lambda text, key, vigenere=vigenere, autokey=autokey:
+                        vigenere.encrypt(key, text, autokey)))
+                benchmarks.append((
+                    "vigenere_decrypt", alphabet, key_length, autokey, args.max_size,
+                    lambda text, key, vigenere=vigenere, autokey=autokey:
+                        vigenere.decrypt(key, text, autokey)))
+
+        # Caesar breaker needs letter frequencies of the alphabet's language
+        if alphabet in LETTER_FREQUENCIES:
+            benchmarks.append((
+                "caesar_break", alphabet, None, None, args.max_size,
+                lambda text, key, alphabet=alphabet: break_caesar(text, alphabet)))
+        benchmarks.append((
+            "atbash", alphabet, None, None, args.max_size,
+            lambda text, key, alphabet=alphabet: atbash(text, alphabet)))
+
+    return benchmarks
+
+def git_commit() -> str:
+    """ Commit being benchmarked, if in a git repository
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args) -> dict:
+    """ Run every benchmark for every size. When a call takes longer than
+        max_seconds, larger sizes of that benchmark are skipped
+    """
+    results = []
+    for name, alphabet, key_length, autokey, max_size, function in cases(args):
+        too_slow = False
+        for size in args.sizes:
+            result = {"benchmark": name, "alphabet": alphabet, "key_length": key_length,
+                      "autokey": autokey, "letters": size}
+
+            if size > max_size or too_slow:
+                result["skipped"] = True
+                results.append(result)
+                continue
+
+            text = random_text(alphabet, size, args.seed)
+            key = random_text(alphabet, key_length or 1, args.seed + 1)
+            result["bytes"] = len(text.encode("utf-8"))
+
+            result.update(measure(lambda: function(text, key), args.repeats))
+            result["mb_per_second"] = result["bytes"] / result["latency_p50"] / 1e6
+            results.append(result)
+
+            too_slow = result["latency_p50"] > args.max_seconds
+            print(json.dumps(result), file=sys.stderr)
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "results": results,
+    }
+
+def parse_args() -> argparse.Namespace:
+    """ Command line options
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="text sizes in letters")
+    parser.add_argument("--max-size", type=int, default=max(SIZES),
+                        help="largest text size to run")
+    parser.add_argument("--alphabets", nargs="+", default=list(ALPHABETS),
+                        choices=list(ALPHABETS))
+    parser.add_argument("--key-lengths", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--autokey", type=lambda value: value.lower() in ("1", "true", "on"),
+                        nargs="+", default=[False, True], help="autokey on/off to run")
+    parser.add_argument("--repeats", type=int, default=5, help="timed calls per case")
+    parser.add_argument("--max-seconds", type=float, default=30.0,
+                        help="skip larger sizes once a call takes longer than this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write JSON to, default stdout")
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    report = run(arguments)
+
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
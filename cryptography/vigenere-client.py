@@ -5,11 +5,18 @@
 # For getting command arguments
 import sys
 
+# For batch records
+import json
+
 # For getting system env
 import os
 import dotenv
 
-from vigenere import Vigenere
+from vigenere import ALPHABETS, Vigenere
+import instrumentation
+from cryptanalysis import LETTER_FREQUENCIES, break_vigenere
+from dictionary_attack import Trie, dictionary_attack
+from autokey_solver import NgramScorer, solve_autokey
 
 class Client:
     """ Client for Vigenère encryption
@@ -21,6 +28,7 @@ class Client:
         self._alphabet = ""
         self._cipher = ""
         self._mode = ""
+        self._batch = ""
 
     @property
     def vigenere(self):
@@ -45,9 +53,11 @@ class Client:
                 self.__encrypt(cipher)
             case "decrypt":
                 self.__decrypt(cipher)
+            case "cryptanalysis":
+                self.__cryptanalysis(cipher)
 
-        # Resets the alphabet to the original
-        self.__set_alphabet(old_alphabet)
+        # Resets the alphabet to the original, which might not be registered
+        self.vigenere.alphabet = old_alphabet
 
     def start(self):
         """ Start the client with configured options
@@ -55,11 +65,17 @@ class Client:
         if self.check_config():
 
             self.__set_alphabet(self.alphabet)
+            if self.batch != "":
+                self.__batch(self.cipher, self.mode, self.batch)
+                return
+
             match self.mode:
                 case "encrypt":
                     self.__encrypt(self.cipher)
                 case "decrypt":
                     self.__decrypt(self.cipher)
+                case "cryptanalysis":
+                    self.__cryptanalysis(self.cipher)
 
         else:
             raise TypeError("Not configured or configured incorrectly! \
@@ -89,11 +105,123 @@ class Client:
                 plaintext = self.vigenere.decrypt(key, ciphertext, autokey=False)
         print("Plaintext:", plaintext)
 
-    def __cryptanalysis(self):
+    def __batch(self, cipher: str, mode: str, source: str):
+        """ Encrypt or decrypt records from source (file or - for stdin) without
+            asking anything, writing a result line for every record as soon as it's done.
+            Records are lines of key and text separated by a tab, or JSON objects
+            with key and text, and optionally cipher and id.
+            Results are text lines, or JSON objects with text (or error) and id
+        """
+        if mode not in ("encrypt", "decrypt"):
+            raise ValueError("Batch mode only encrypts and decrypts")
+
+        if source == "-":
+            self.__run_batch(cipher, mode, sys.stdin, sys.stdout)
+        else:
+            with open(source, encoding="utf-8") as records:
+                self.__run_batch(cipher, mode, records, sys.stdout)
+
+    def __run_batch(self, cipher: str, mode: str, records, output):
+        """ Run every record line through the cipher. A bad record gets an error
+            result, and the rest of the records are still run. Stops quietly
+            if the reader of output goes away, like head does
+        """
+        try:
+            self.__write_batch(cipher, mode, records, output)
+        except BrokenPipeError:
+            # Python flushes output once more at exit, which would fail again
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, output.fileno())
+
+    def __write_batch(self, cipher: str, mode: str, records, output):
+        """ Write a result line for every record line
+        """
+        for line_number, line in enumerate(records, start=1):
+            line = line.rstrip("\r\n")
+            if line == "":
+                continue
+
+            if line.startswith("{"):
+                result = {}
+                try:
+                    record = json.loads(line)
+                    if "id" in record:
+                        result["id"] = record["id"]
+                    record_cipher = self.__validate_cipher(record.get("cipher", cipher))
+                    if record_cipher == "invalid":
+                        raise ValueError(f"Unknown cipher {record['cipher']!r}")
+                    result["text"] = self.__run_record(mode, record["key"], record["text"],
+                                                       record_cipher == "autokey")
+                except KeyError as error:
+                    result["error"] = f"Missing {error}"
+                except ValueError as error:
+                    result["error"] = str(error)
+                except (TypeError, AttributeError) as error:
+                    result["error"] = f"Invalid record: {error}"
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+            else:
+                key, tab, text = line.partition("\t")
+                try:
+                    if tab == "":
+                        raise ValueError("Key and text must be separated by a tab")
+                    output.write(self.__run_record(mode, key, text, cipher == "autokey") + "\n")
+                except ValueError as error:
+                    print(f"Record {line_number}:", error, file=sys.stderr)
+                    output.write("\n")
+
+            # Results are written as soon as they're done, also into a pipe
+            output.flush()
+
+    def __run_record(self, mode: str, key: str, text: str, autokey: bool) -> str:
+        """ Encrypt or decrypt one batch record
+        """
+        if mode == "encrypt":
+            return self.vigenere.encrypt(key, text, autokey=autokey)
+
+        return self.vigenere.decrypt(key, text, autokey=autokey)
+
+    def __cryptanalysis(self, cipher: str):
         """ Analyse ciphertext and attempt to decrypt it
         """
-        # TODO: Implement cryptanalysis
-        raise NotImplementedError
+        ciphertext = input("Input ciphertext: ")
+        match cipher:
+            case "autokey":
+                key, _ = solve_autokey(self.vigenere, ciphertext, self.__input_scorer())[0]
+                print("Key:", key, f"(key length {len(key)})")
+                print("Plaintext:", self.vigenere.decrypt(key, ciphertext, autokey=True))
+            case "vigenere":
+                path = input("Input wordlist for a dictionary attack: (empty for none) ")
+                if path == "":
+                    key, language, _ = break_vigenere(self.vigenere, ciphertext)[0]
+                    print("Key:", key, f"(key length {len(key)}, {language})")
+                else:
+                    results, statistics = dictionary_attack(
+                        self.vigenere, ciphertext, Trie.from_file(self.vigenere, path))
+                    key, _ = results[0]
+                    print("Key:", key, f"(key length {len(key)}, "
+                          f"{statistics['candidates_per_second']:,.0f} candidates/s)")
+                # Analysis leaves out letters not in the alphabet, so they don't use up the key
+                print("Plaintext:", self.vigenere.decrypt(key, ciphertext, autokey=False,
+                                                          passthrough=True))
+
+    def __input_scorer(self) -> NgramScorer:
+        """ Input text file to count quadgram statistics from for autokey cryptanalysis.
+            Without one, statistics are estimated from letter frequencies
+        """
+        language = next((name for name in LETTER_FREQUENCIES
+                         if ALPHABETS.get(name) == self.vigenere.alphabet), None)
+
+        path = input("Input text file for quadgram statistics: (empty for none) ")
+        while path == "" and language is None:
+            print("No letter frequencies for the alphabet, a text file is needed!")
+            path = input("Input text file for quadgram statistics: ")
+
+        if path == "":
+            return NgramScorer.from_frequencies(language, self.vigenere.alphabet)
+
+        with open(path, encoding="utf-8") as text_file:
+            return NgramScorer.from_text(self.vigenere, text_file.read())
 
     # Functions on configuration
     # TODO: Modify so that you dont have to have the previous ones for the later ones to work
@@ -113,9 +241,15 @@ class Client:
                     self.cipher = self.__validate_cipher(arg)
                 case 2:
                     self.mode = self.__validate_mode(arg)
+                case 3:
+                    self.batch = self.__validate_batch(arg)
                 case _:
                     raise ValueError(f"Too many arguments! \
-                                        Passed {len(configs)}, but function takes 3.")
+                                        Passed {len(configs)}, but function takes 4.")
+
+        # Batch mode can't ask anything, stdin might be the records
+        if self.batch != "" and "" in (self.alphabet, self.cipher, self.mode):
+            raise ValueError("Batch mode must have alphabet, cipher and mode configured")
 
         if self.alphabet == "":
             self.alphabet = self.__input_alphabet()
@@ -132,15 +266,17 @@ class Client:
         alphabet = self.__validate_alphabet(self.alphabet)
         cipher = self.__validate_cipher(self.cipher)
         mode = self.__validate_mode(self.mode)
+        batch = self.__validate_batch(self.batch) if self.batch != "" else ""
 
-        if alphabet != "invalid" and cipher != "invalid" and mode != "invalid":
+        if alphabet != "invalid" and cipher != "invalid" and mode != "invalid" \
+                and batch != "invalid":
             return True
 
         return False
 
     def check_args(self) -> list:
         """ Check if arguments have been passed when running client
-            Note they must be passed in order of alphabet, cipher, mode.
+            Note they must be passed in order of alphabet, cipher, mode, batch.
         """
         sys_args = []
         for i, arg in enumerate(sys.argv):
@@ -157,6 +293,10 @@ class Client:
                     mode = self.__validate_mode(arg)
                     sys_args.append(mode)
 
+                case 4:
+                    batch = self.__validate_batch(arg)
+                    sys_args.append(batch)
+
                 case _:
                     pass
 
@@ -164,7 +304,7 @@ class Client:
 
     def check_env(self) -> list:
         """ Check environment variables, named VIGENERE_ALPHABET,
-            VIGENERE_CIPHER and VIGENERE_MODE.
+            VIGENERE_CIPHER, VIGENERE_MODE and VIGENERE_BATCH.
         """
 
         dotenv.load_dotenv()
@@ -182,15 +322,46 @@ class Client:
         if mode is not None:
             envs.append(self.__validate_mode(mode))
 
+        batch = os.getenv("VIGENERE_BATCH")
+        if batch is not None:
+            # Configs are taken in order, so batch would end up in another's place
+            missing = [name for name, value in (("VIGENERE_ALPHABET", alphabet),
+                                                ("VIGENERE_CIPHER", cipher),
+                                                ("VIGENERE_MODE", mode)) if value is None]
+            if missing:
+                raise ValueError("VIGENERE_BATCH needs " + ", ".join(missing) + " set too")
+            envs.append(self.__validate_batch(batch))
+
         return envs
 
+    def check_instrumentation(self) -> bool:
+        """ Turn instrumentation on if environment variable VIGENERE_INSTRUMENT
+            is set. VIGENERE_PROFILE_CALLS profiles that many calls, and
+            VIGENERE_PROFILE writes the profile to a file
+        """
+        dotenv.load_dotenv()
+
+        if os.getenv("VIGENERE_INSTRUMENT", "").lower() not in ("1", "true", "on"):
+            return False
+
+        instrumentation.enable()
+        instrumentation.instrument(Client, "start", "client_start",
+                                   alphabet=lambda client: client.alphabet)
+
+        calls = os.getenv("VIGENERE_PROFILE_CALLS")
+        if calls is not None:
+            instrumentation.profile_next(int(calls), os.getenv("VIGENERE_PROFILE"))
+
+        return True
+
     # Functions on alphabet
     def __input_alphabet(self) -> str:
         """ Input which alphabet to use
         """
         input_alphabet = True
         while input_alphabet:
-            alphabet = input("Alphabet: (Finnish/English) ")
+            names = "/".join(name.capitalize() for name in ALPHABETS)
+            alphabet = input(f"Alphabet: ({names}) ")
             match self.__validate_alphabet(alphabet):
                 case "finnish":
                     input_alphabet = False
@@ -200,6 +371,9 @@ class Client:
                     return "english"
                 case "invalid":
                     print("Invalid input!")
+                case registered:
+                    input_alphabet = False
+                    return registered
 
     def __validate_alphabet(self, alphabet: str) -> str:
         """ Validate if given alphabet is correct, and returns it in correct format
@@ -211,6 +385,9 @@ class Client:
         if alphabet.lower() == "english" or alphabet.lower() == "e" or alphabet.lower() == "en":
             return "english"
 
+        if alphabet.lower() in ALPHABETS:
+            return alphabet.lower()
+
         return "invalid"
 
     def config_alphabet(self) -> None:
@@ -227,7 +404,7 @@ class Client:
 
     @property
     def alphabet(self):
-        """ Alphabet client uses: Finnish/English
+        """ Alphabet client uses: Finnish/English or another registered alphabet
         """
         return self._alphabet
 
@@ -282,12 +459,12 @@ class Client:
 
     # Functions on mode
     def __input_mode(self) -> str:
-        """ Input which mode to use. Currently accepts encryption and decryption,
-            but cryptanalysis is planned
+        """ Input which mode to use. Currently accepts encryption, decryption
+            and cryptanalysis
         """
         input_mode = True
         while input_mode:
-            mode = input("Mode: (Encrypt/Decrypt) ")
+            mode = input("Mode: (Encrypt/Decrypt/Cryptanalysis) ")
 
             match self.__validate_mode(mode):
                 case "encrypt":
@@ -296,6 +473,9 @@ class Client:
                 case "decrypt":
                     input_mode = False
                     return "decrypt"
+                case "cryptanalysis":
+                    input_mode = False
+                    return "cryptanalysis"
                 case "invalid":
                     print("Invalid input!")
 
@@ -309,6 +489,9 @@ class Client:
         if mode.lower() == "decrypt" or mode.lower() == "d" or mode.lower() == "de":
             return "decrypt"
 
+        if mode.lower() == "cryptanalysis" or mode.lower() == "c" or mode.lower() == "ca":
+            return "cryptanalysis"
+
         return "invalid"
 
     def config_mode(self) -> None:
@@ -319,7 +502,7 @@ class Client:
 
     @property
     def mode(self):
-        """ Mode client uses: Encryption/Decryption
+        """ Mode client uses: Encryption/Decryption/Cryptanalysis
         """
         return self._mode
 
@@ -327,12 +510,40 @@ class Client:
     def mode(self, mode: str):
         self._mode = mode
 
+    # Functions on batch
+    def __validate_batch(self, batch: str) -> str:
+        """ Validate if given batch source is correct, and returns it in correct format.
+            Source is a file of records, or - for stdin
+        """
+        if batch == "-" or batch.lower() == "stdin":
+            return "-"
+
+        if os.path.isfile(batch):
+            return batch
+
+        return "invalid"
+
+    @property
+    def batch(self):
+        """ Batch source client reads records from, empty for interactive use
+        """
+        return self._batch
+
+    @batch.setter
+    def batch(self, batch: str):
+        self._batch = batch
+
 if __name__ == "__main__":
     client = Client()
 
-    args = client.check_env()
+    args = client.check_args() or client.check_env()
     if args:
         client.config(args)
     else:
         client.config()
+    instrumented = client.check_instrumentation()
     client.start()
+
+    if instrumented:
+        # Metrics go to stderr, so they don't mix with batch output
+        print(instrumentation.prometheus(), end="", file=sys.stderr)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+""" Network service for Vigenère encryption, speaking line-delimited JSON over
+    TCP or a Unix socket. Keeps one warm Vigenere per alphabet, so lookup tables
+    and compiled keys stay around between requests
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from vigenere import ALPHABETS, Vigenere
+
+# Upper bounds of latency histogram buckets in seconds, the last one catches the rest
+LATENCY_BUCKETS = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf")]
+
+class VigenereServer:
+    """ Serves requests like
+            {"id": 1, "op": "encrypt", "alphabet": "finnish", "cipher": "autokey",
+             "key": "AVAIN", "text": "KISSA", "passthrough": false}
+        with {"id": 1, "text": "..."} or {"id": 1, "error": "..."}.
+        Op can be encrypt, decrypt or stats
+    """
+    def __init__(self, offload_threshold: int = 1 << 16, workers: int = None):
+        self._vigeneres: dict[str, Vigenere] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._offload_threshold = offload_threshold
+
+        self._counters = {"connections": 0, "requests": 0, "errors": 0, "offloaded": 0,
+                          "letters": 0}
+        self._latencies = {op: [0] * len(LATENCY_BUCKETS) for op in ("encrypt", "decrypt")}
+
+    def vigenere(self, alphabet: str) -> Vigenere:
+        """ Warm Vigenere for alphabet, created on first use
+        """
+        alphabet = alphabet.lower()
+        if alphabet not in self._vigeneres:
+            if alphabet not in ALPHABETS:
+                raise ValueError("Unknown alphabet: " + alphabet)
+            self._vigeneres[alphabet] = Vigenere(alphabet)
+
+        return self._vigeneres[alphabet]
+
+    def stats(self) -> dict:
+        """ Request counters and latency histograms of the server
+        """
+        return {
+            "counters": dict(self._counters),
+            "latency_buckets": LATENCY_BUCKETS[:-1] + ["inf"],
+            "latencies": {op: list(counts) for op, counts in self._latencies.items()},
+            "key_caches": {alphabet: vigenere.compiled_key_cache_info()._asdict()
+                           for alphabet, vigenere in self._vigeneres.items()},
+        }
+
+    async def handle_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter) -> None:
+        """ Answer every request line of one client, in order
+        """
+        self._counters["connections"] += 1
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                response = await self.handle_request(line)
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            # Client went away, or sent a line longer than the stream limit
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, line: bytes) -> dict:
+        """ Answer one request
+        """
+        self._counters["requests"] += 1
+        response = {}
+        try:
+            request = json.loads(line)
+            if "id" in request:
+                response["id"] = request["id"]
+
+            match request.get("op"):
+                case "stats":
+                    response["stats"] = self.stats()
+                case "encrypt" | "decrypt":
+                    response["text"] = await self._cipher(request)
+                case op:
+                    raise ValueError(f"Unknown op: {op}")
+
+        except KeyError as error:
+            self._counters["errors"] += 1
+            response["error"] = f"Missing {error}"
+        except (ValueError, TypeError, AttributeError) as error:
+            self._counters["errors"] += 1
+            response["error"] = str(error)
+
+        return response
+
+    async def _cipher(self, request: dict) -> str:
+        """ Encrypt or decrypt request's text, offloading large texts to the
+            executor so that they don't hold up the other clients
+        """
+        op = request["op"]
+        vigenere = self.vigenere(request.get("alphabet", "finnish"))
+        function = vigenere.encrypt if op == "encrypt" else vigenere.decrypt
+        autokey = request.get("cipher", "vigenere").lower() in ("autokey", "a")
+        key, text = request["key"], request["text"]
+        passthrough = bool(request.get("passthrough", False))
+
+        start = time.perf_counter()
+        if len(text) > self._offload_threshold:
+            self._counters["offloaded"] += 1
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._executor, lambda: function(key, text, autokey, passthrough))
+        else:
+            result = function(key, text, autokey, passthrough)
+
+        latency = time.perf_counter() - start
+        self._latencies[op][bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self._counters["letters"] += len(text)
+
+        return result
+
+async def serve(server: VigenereServer, host: str, port: int, unix: str,
+                line_limit: int) -> None:
+    """ Serve on TCP host and port, or on Unix socket if given
+    """
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle_client, unix, limit=line_limit)
+    else:
+        listener = await asyncio.start_server(server.handle_client, host, port, limit=line_limit)
+
+    async with listener:
+        await listener.serve_forever()
+
+def parse_args() -> argparse.Namespace:
+    """ Command line options
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--offload-threshold", type=int, default=1 << 16,
+                        help="texts longer than this run in the executor")
+    parser.add_argument("--workers", type=int, help="executor threads")
+    parser.add_argument("--line-limit", type=int, default=1 << 26,
+                        help="longest request line in bytes")
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    vigenere_server = VigenereServer(arguments.offload_threshold, arguments.workers)
+    try:
+        asyncio.run(serve(vigenere_server, arguments.host, arguments.port, arguments.unix,
+                          arguments.line_limit))
+    except KeyboardInterrupt:
+        pass
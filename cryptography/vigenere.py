@@ -1,11 +1,78 @@
 """ Barebones implementation for Vigenère encryption
 """
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from itertools import islice
+import mmap
+import os
+
+import numpy as np
+
+ALPHABETS = {
+    "finnish": "ABCDEFGHIJKLMNOPQRSTUVWXYZÅÄÖ",
+    "english": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
+    "greek": "ΑΒΓΔΕΖΗΘΙΚΛΜΝΞΟΠΡΣΤΥΦΧΨΩ",
+    "russian": "АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ",
+}
+
+def register_alphabet(name: str, letters: str) -> None:
+    """ Register alphabet under name, so that it can be set by name
+    """
+    validate_alphabet(letters)
+    ALPHABETS[name.lower()] = letters
+
+def validate_alphabet(letters: str) -> None:
+    """ Validates alphabet has letters, each of them once
+    """
+    if len(letters) < 2:
+        raise ValueError("Alphabet must have at least two letters")
+
+    if len(set(letters)) != len(letters):
+        raise ValueError("Alphabet has duplicate letters")
+
+def alternating_row_sums(values: np.ndarray, window: np.ndarray, modulus: int) -> np.ndarray:
+    """ Closed form of autokey decryption, where every value is the one
+        len(window) places earlier subtracted from it. Written in rows of
+        len(window), row r is (-1)^r * (row 0 - row 1 + ... + (-1)^r * row r - window),
+        that is one cumulative sum. With modulus 256 the sums wrap around in bytes
+    """
+    key_length = len(window)
+    rows = -(-len(values) // key_length)
+    dtype = np.uint8 if modulus == 256 else np.int64
+
+    grid = np.zeros((rows, key_length), dtype=dtype)
+    grid.ravel()[:len(values)] = values
+    # modulus - 1 is -1 in modular arithmetic, and fits in the unsigned bytes
+    signs = np.ones((rows, 1), dtype=dtype)
+    signs[1::2] = modulus - 1
+
+    grid *= signs
+    np.cumsum(grid, axis=0, dtype=dtype, out=grid)
+    grid -= window.astype(dtype)
+    grid *= signs
+    if modulus != 256:
+        grid %= modulus
+
+    return grid.ravel()[:len(values)]
+
+# How many compiled keys every Vigenere keeps
+KEY_CACHE_SIZE = 1024
+
 class Vigenere:
-    """ Vigenère encryption with Finnish alphabet
+    """ Vigenère encryption, with Finnish alphabet by default
     """
-    def __init__(self, alphabet: str = "finnish"):
+    def __init__(self, alphabet: str = "finnish", letters: str = None):
+        """ Alphabet is a registered name, or letters gives the alphabet's letters in order
+        """
         self._alphabet: str
-        self.set_alphabet(alphabet)
+        self._index_table: np.ndarray
+        self._letter_codes: np.ndarray
+        if letters is not None:
+            self.alphabet = letters
+        else:
+            self.set_alphabet(alphabet)
 
     @property
     def alphabet(self) -> str:
@@ -15,80 +82,455 @@ class Vigenere:
 
     @alphabet.setter
     def alphabet(self, alphabet: str) -> str:
+        validate_alphabet(alphabet)
         self._alphabet = alphabet
+        self._build_tables()
+
+    def _build_tables(self) -> None:
+        """ Build lookup tables for the alphabet, so that a letter can be turned
+            into its index (and back) without searching through the alphabet
+        """
+        self._letter_indices = {letter: index for index, letter in enumerate(self.alphabet)}
+
+        # Text is upper-cased, unless the alphabet has lower case letters of its own
+        self._fold_case = self.alphabet == self.alphabet.upper()
+
+        self._letter_codes = np.array([ord(letter) for letter in self.alphabet], dtype=np.uint32)
+
+        # Every code point not in the alphabet maps to -1, including the last
+        # slot which catches everything larger than the alphabet's largest letter
+        self._index_table = np.full(int(self._letter_codes.max()) + 2, -1, dtype=np.int64)
+        self._index_table[self._letter_codes] = np.arange(len(self.alphabet))
+
+        # Compiled keys are only valid for the alphabet they were compiled with
+        self._compiled_keys = lru_cache(maxsize=KEY_CACHE_SIZE)(self._compile_key)
+
+    def compile_key(self, key: str) -> np.ndarray:
+        """ Key as alphabet indices. Keys are cached, so a key used again
+            doesn't have to be upper-cased, validated and looked up again
+        """
+        return self._compiled_keys(key)
+
+    def compiled_key_cache_info(self):
+        """ Hits, misses and size of the compiled key cache
+        """
+        return self._compiled_keys.cache_info()
+
+    def _compile_key(self, key: str) -> np.ndarray:
+        """ Compile key without the cache
+        """
+        key_indices = self.encode(self.normalize(key))
+        # Shared between calls, so it must not change
+        key_indices.flags.writeable = False
+
+        return key_indices
 
     def set_alphabet(self, alphabet: str):
-        """ Set the alphabet, currently either finnish or english
+        """ Set the alphabet by its registered name (e.g. finnish or english).
+            Other alphabets are set by their letters, with the alphabet property
         """
-        match alphabet.lower():
-            case "finnish":
-                self.alphabet: str = "ABCDEFGHIJKLMNOPQRSTUVWXYZÅÄÖ"
-            case "english":
-                self.alphabet: str = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+        if alphabet.lower() not in ALPHABETS:
+            raise ValueError("Unknown alphabet: " + alphabet)
+
+        self.alphabet: str = ALPHABETS[alphabet.lower()]
+
+    def normalize(self, text: str) -> str:
+        """ Upper-case text, unless the alphabet has lower case letters
+        """
+        return text.upper() if self._fold_case else text
 
     def alphabet_index(self, letter_to_find: str) -> int:
         """ Finds index in alphabet of given letter
         """
-        for index, letter_in_alphabet in enumerate(self.alphabet):
-            if letter_to_find == letter_in_alphabet:
-                return index
+        if letter_to_find not in self._letter_indices:
+            raise ValueError("Illegal letter: " + letter_to_find)
 
-        raise ValueError("Illegal letter: " + letter_to_find)
+        return self._letter_indices[letter_to_find]
 
     def validate_text(self, validetable_text: str) -> None:
         """ Validates text doesn't have illegal letters
         """
         for letter in validetable_text:
             # Check for illegal letters
-            if letter not in self.alphabet:
+            if letter not in self._letter_indices:
                 raise ValueError("Illegal letter: " + letter)
 
-    def encrypt(self, key: str, plaintext: str, autokey = False) -> str:
-        """ Encrypt with Vigenère cipher, plaintext and key must only consist of
-            letters in Finnish alphabet
-            Also supports Vigenère autokey cipher
+    def lookup(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        """ Code points of text and their alphabet indices, in one pass over the text.
+            Letters not in the alphabet get index -1
         """
-        plaintext = plaintext.upper()
-        self.validate_text(plaintext)
-        key = key.upper()
-        self.validate_text(key)
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        indices = self._index_table[np.minimum(codes, len(self._index_table) - 1)]
 
+        return codes, indices
 
-        ciphertext = ""
-        for index, letter in enumerate(plaintext):
-            letter_index: int = self.alphabet_index(letter)
+    def encode(self, text: str, strict = True) -> np.ndarray:
+        """ Turns text into an array of alphabet indices, validating it at the same time.
+            If not strict, letters not in the alphabet are left out instead
+        """
+        _, indices = self.lookup(text)
 
-            if len(key)-1 >= index or not autokey:
-                key_letter = key[index%len(key)]
-                key_index: int = self.alphabet_index(key_letter)
-            else:
-                key_index: int = self.alphabet_index(plaintext[(index-1)-(len(key)-1)])
+        if not strict:
+            return indices[indices >= 0]
 
-            new_index: int = (letter_index + key_index) % len(self.alphabet)
-            ciphertext += self.alphabet[new_index]
+        self._check_letters(text, indices)
 
-        return ciphertext
+        return indices
+
+    @staticmethod
+    def _check_letters(text: str, indices: np.ndarray) -> None:
+        """ Raise on the first letter of text not in the alphabet
+        """
+        illegal = np.flatnonzero(indices < 0)
+        if illegal.size:
+            raise ValueError("Illegal letter: " + text[illegal[0]])
 
-    def decrypt(self, key: str, ciphertext: str, autokey = False) -> str:
+    def decode(self, indices: np.ndarray) -> str:
+        """ Turns an array of alphabet indices back into text
+        """
+        return self._letter_codes[indices].tobytes().decode("utf-32-le")
+
+    @staticmethod
+    def repeat_key(key_indices: np.ndarray, length: int, offset: int = 0) -> np.ndarray:
+        """ Repeats key to given length, starting from key position offset
+        """
+        if len(key_indices) == 0:
+            raise ValueError("Key must not be empty")
+
+        repeats = -(-length // len(key_indices))
+
+        # Tiling whole copies of the key is much faster than np.resize for short keys
+        return np.tile(np.roll(key_indices, -offset), repeats)[:length]
+
+    def encrypt(self, key: str, plaintext: str, autokey = False, passthrough = False) -> str:
+        """ Encrypt with Vigenère cipher, plaintext and key must only consist of
+            letters in Finnish alphabet
+            Also supports Vigenère autokey cipher
+            With passthrough, other characters in plaintext (spaces, punctuation)
+            are copied to ciphertext as they are, without using up the key
+        """
+        return self._cipher(key, plaintext, autokey, passthrough, decrypting=False)
+
+    def decrypt(self, key: str, ciphertext: str, autokey = False, passthrough = False) -> str:
         """ Decrypt Vigenère cipher, ciphertext and key must only consist of
             letters in Finnish alphabet
             Also supports Vigenère autokey cipher
+            With passthrough, other characters in ciphertext are copied to
+            plaintext as they are, without using up the key
+        """
+        return self._cipher(key, ciphertext, autokey, passthrough, decrypting=True)
+
+    def _cipher(self, key: str, text: str, autokey: bool, passthrough: bool,
+                decrypting: bool) -> str:
+        """ Encrypt or decrypt text, looking up and validating its letters in one pass
+        """
+        text = self.normalize(text)
+        codes, indices = self.lookup(text)
+        if passthrough:
+            letters = indices >= 0
+            indices = indices[letters]
+        else:
+            self._check_letters(text, indices)
+
+        key_indices = self.compile_key(key)
+
+        if len(indices) == 0:
+            return text if passthrough else ""
+
+        new_indices = self._shift(indices, key_indices, autokey, decrypting)
+
+        if not passthrough:
+            return self.decode(new_indices)
+
+        codes = codes.copy()
+        codes[letters] = self._letter_codes[new_indices]
+
+        return codes.tobytes().decode("utf-32-le")
+
+    def _shift(self, indices: np.ndarray, key_indices: np.ndarray, autokey: bool,
+               decrypting: bool) -> np.ndarray:
+        """ Shift letter indices with the key stream
         """
-        ciphertext = ciphertext.upper()
-        self.validate_text(ciphertext)
-        key = key.upper()
-        self.validate_text(key)
+        if not autokey:
+            key_stream = self.repeat_key(key_indices, len(indices))
+            if decrypting:
+                return (indices - key_stream) % len(self.alphabet)
+            return (indices + key_stream) % len(self.alphabet)
 
-        plaintext = ""
-        for index, letter in enumerate(ciphertext):
-            letter_index: int = self.alphabet_index(letter)
+        if decrypting:
+            if len(key_indices) == 0:
+                raise ValueError("Key must not be empty")
+            return self._decrypt_autokey_indices(indices, key_indices)
+
+        # Autokey continues the key with the plaintext itself
+        key_stream = np.concatenate((key_indices, indices))[:len(indices)]
+
+        return (indices + key_stream) % len(self.alphabet)
+
+    # Bytes, with all 256 byte values as the alphabet
+    def encrypt_bytes(self, key: bytes, data: bytes, autokey = False, out = None):
+        """ Encrypt bytes, bytearray or memoryview with Vigenère over byte values.
+            Ciphertext is written into out, which can be data itself, or a new
+            bytearray if out is None. Returns the buffer written to
+        """
+        return self._bytes(key, data, autokey, out, decrypting=False)
+
+    def decrypt_bytes(self, key: bytes, data: bytes, autokey = False, out = None):
+        """ Decrypt bytes, bytearray or memoryview with Vigenère over byte values.
+            Plaintext is written into out, which can be data itself, or a new
+            bytearray if out is None. Returns the buffer written to
+        """
+        return self._bytes(key, data, autokey, out, decrypting=True)
+
+    def encrypt_file_in_place(self, key: bytes, path: str, autokey = False,
+                              chunk_size: int = 1 << 24) -> None:
+        """ Encrypt file in place through a memory map, chunk_size bytes at a time
+        """
+        self._file_in_place(key, path, autokey, chunk_size, decrypting=False)
+
+    def decrypt_file_in_place(self, key: bytes, path: str, autokey = False,
+                              chunk_size: int = 1 << 24) -> None:
+        """ Decrypt file in place through a memory map, chunk_size bytes at a time
+        """
+        self._file_in_place(key, path, autokey, chunk_size, decrypting=True)
+
+    def _bytes(self, key: bytes, data: bytes, autokey: bool, out, decrypting: bool):
+        """ Encrypt or decrypt bytes into out
+        """
+        if out is None:
+            out = bytearray(len(data))
+        if len(out) != len(data):
+            raise ValueError("Output buffer must be as long as the data")
+
+        key_bytes = np.frombuffer(key, dtype=np.uint8)
+        if len(key_bytes) == 0:
+            raise ValueError("Key must not be empty")
+
+        self._shift_bytes(np.frombuffer(data, dtype=np.uint8),
+                          np.frombuffer(out, dtype=np.uint8),
+                          key_bytes, autokey, decrypting, 0, key_bytes)
+
+        return out
+
+    def _file_in_place(self, key: bytes, path: str, autokey: bool, chunk_size: int,
+                       decrypting: bool) -> None:
+        """ Encrypt or decrypt file in place, carrying the key position and the
+            autokey window from one chunk to the next
+        """
+        key_bytes = np.frombuffer(key, dtype=np.uint8)
+        if len(key_bytes) == 0:
+            raise ValueError("Key must not be empty")
+
+        with open(path, "r+b") as data_file:
+            if os.fstat(data_file.fileno()).st_size == 0:
+                return
+
+            with mmap.mmap(data_file.fileno(), 0) as data_map:
+                data = np.frombuffer(data_map, dtype=np.uint8)
+                try:
+                    window = key_bytes
+                    for start in range(0, len(data), chunk_size):
+                        end = start + chunk_size
+                        window = self._shift_bytes(data[start:end], data[start:end], key_bytes,
+                                                   autokey, decrypting, start % len(key_bytes),
+                                                   window)
+                finally:
+                    # The memory map can't be closed while an array uses it
+                    del data
+
+    @staticmethod
+    def _shift_bytes(data: np.ndarray, out: np.ndarray, key: np.ndarray, autokey: bool,
+                     decrypting: bool, position: int, window: np.ndarray) -> np.ndarray:
+        """ Shift bytes of data into out, which may be data itself. Byte arithmetic
+            wraps around at 256 by itself, so no modulo is needed.
+            position is the repeating key position, and window the last len(key)
+            bytes of the autokey key stream source. Returns the window after data
+        """
+        length = len(data)
+        key_length = len(key)
+
+        if not autokey:
+            key = np.roll(key, -position)
+            shift = np.subtract if decrypting else np.add
+
+            # Full rows of key length get the key added to every row at once
+            full = length // key_length * key_length
+            shift(data[:full].reshape(-1, key_length), key,
+                  out=out[:full].reshape(-1, key_length))
+            shift(data[full:], key[:length - full], out=out[full:])
+
+            return window
+
+        if not decrypting:
+            next_window = np.concatenate((window, data[-key_length:]))[-key_length:]
+
+            # Autokey continues the key with the plaintext itself. The tail is done
+            # first, while the head of data is still plaintext, if out is data
+            head = min(key_length, length)
+            np.add(data[key_length:], data[:max(length - key_length, 0)], out=out[key_length:])
+            np.add(data[:head], window[:head], out=out[:head])
+
+            return next_window
+
+        # Every plaintext byte is the ciphertext byte minus the plaintext byte
+        # key length earlier, the window holding the ones before data
+        out[:] = alternating_row_sums(data, window, 256)
+
+        return np.concatenate((window, out[-key_length:]))[-key_length:]
+
+    # Batches, for many short texts
+    def encrypt_many(self, records: Iterable[tuple[str, str, bool]], workers: int = 0,
+                     use_processes = False, batch_size: int = 1024) -> Iterator[str]:
+        """ Encrypt (key, plaintext, autokey) records, yielding ciphertexts in order.
+            With workers, batches of batch_size records are shared out to a thread
+            pool, or a process pool if use_processes
+        """
+        return self._many(records, workers, use_processes, batch_size, decrypting=False)
+
+    def decrypt_many(self, records: Iterable[tuple[str, str, bool]], workers: int = 0,
+                     use_processes = False, batch_size: int = 1024) -> Iterator[str]:
+        """ Decrypt (key, ciphertext, autokey) records, yielding plaintexts in order.
+            With workers, batches of batch_size records are shared out to a thread
+            pool, or a process pool if use_processes
+        """
+        return self._many(records, workers, use_processes, batch_size, decrypting=True)
+
+    def _many(self, records: Iterable[tuple[str, str, bool]], workers: int,
+              use_processes: bool, batch_size: int, decrypting: bool) -> Iterator[str]:
+        """ Run records through the cipher, in this thread or in a pool
+        """
+        if workers == 0:
+            for key, text, autokey in records:
+                if decrypting:
+                    yield self.decrypt(key, text, autokey)
+                else:
+                    yield self.encrypt(key, text, autokey)
+            return
+
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        records = iter(records)
+        with executor_class(max_workers=workers) as executor:
+            # Only a few batches are in the pool at a time, so records
+            # can come from a stream that doesn't fit in memory
+            pending = deque()
+            while True:
+                batch = list(islice(records, batch_size))
+                if batch:
+                    pending.append(executor.submit(_cipher_records, self.alphabet, batch,
+                                                   decrypting))
+                if pending and (not batch or len(pending) >= 2 * workers):
+                    yield from pending.popleft().result()
+                elif not batch:
+                    return
+
+    # Streaming, for texts too large to hold in memory at once
+    def encrypt_stream(self, key: str, chunks: Iterable[str], autokey = False,
+                       passthrough = False) -> Iterator[str]:
+        """ Encrypt text given in chunks, yielding ciphertext one chunk at a time.
+            The output joined together is the same as encrypting the whole text
+        """
+        return self._stream(key, chunks, autokey, passthrough, decrypting=False)
+
+    def decrypt_stream(self, key: str, chunks: Iterable[str], autokey = False,
+                       passthrough = False) -> Iterator[str]:
+        """ Decrypt text given in chunks, yielding plaintext one chunk at a time.
+            The output joined together is the same as decrypting the whole text
+        """
+        return self._stream(key, chunks, autokey, passthrough, decrypting=True)
+
+    def encrypt_file(self, key: str, input_path: str, output_path: str,
+                     autokey = False, passthrough = False, chunk_size: int = 1 << 20) -> None:
+        """ Encrypt file to another file, reading chunk_size letters at a time
+        """
+        with open(input_path, encoding="utf-8", newline="") as input_file, \
+             open(output_path, "w", encoding="utf-8", newline="") as output_file:
+            chunks = iter(lambda: input_file.read(chunk_size), "")
+            for ciphertext in self.encrypt_stream(key, chunks, autokey, passthrough):
+                output_file.write(ciphertext)
+
+    def decrypt_file(self, key: str, input_path: str, output_path: str,
+                     autokey = False, passthrough = False, chunk_size: int = 1 << 20) -> None:
+        """ Decrypt file to another file, reading chunk_size letters at a time
+        """
+        with open(input_path, encoding="utf-8", newline="") as input_file, \
+             open(output_path, "w", encoding="utf-8", newline="") as output_file:
+            chunks = iter(lambda: input_file.read(chunk_size), "")
+            for plaintext in self.decrypt_stream(key, chunks, autokey, passthrough):
+                output_file.write(plaintext)
+
+    def _stream(self, key: str, chunks: Iterable[str], autokey: bool, passthrough: bool,
+                decrypting: bool) -> Iterator[str]:
+        """ Run chunks through the cipher, carrying the key position and the
+            autokey window from one chunk to the next
+        """
+        key_indices = self.compile_key(key)
+        if len(key_indices) == 0:
+            raise ValueError("Key must not be empty")
+
+        # Position in the repeating key, and for autokey the last len(key)
+        # letters of the key stream source, which starts out as the key itself
+        position = 0
+        window = key_indices
+
+        for chunk in chunks:
+            chunk = self.normalize(chunk)
+            codes, indices = self.lookup(chunk)
+            if passthrough:
+                letters = indices >= 0
+                indices = indices[letters]
+            else:
+                self._check_letters(chunk, indices)
+
+            if len(indices) == 0:
+                if passthrough and chunk:
+                    yield chunk
+                continue
+
+            if not autokey:
+                key_stream = self.repeat_key(key_indices, len(indices), position)
+                position = (position + len(indices)) % len(key_indices)
+                if decrypting:
+                    new_indices = (indices - key_stream) % len(self.alphabet)
+                else:
+                    new_indices = (indices + key_stream) % len(self.alphabet)
+
+            elif decrypting:
+                new_indices = self._decrypt_autokey_indices(indices, window)
+                window = np.concatenate((window, new_indices))[-len(key_indices):]
 
-            if len(key)-1 >= index or not autokey:
-                key_index: int = self.alphabet_index(key[index%len(key)])
             else:
-                key_index: int = self.alphabet_index(plaintext[(index-1)-(len(key)-1)])
+                source = np.concatenate((window, indices))
+                window = source[-len(key_indices):]
+                new_indices = (indices + source[:len(indices)]) % len(self.alphabet)
+
+            if passthrough:
+                codes = codes.copy()
+                codes[letters] = self._letter_codes[new_indices]
+                yield codes.tobytes().decode("utf-32-le")
+            else:
+                yield self.decode(new_indices)
+
+    def _decrypt_autokey_indices(self, ciphertext_indices: np.ndarray,
+                                 window: np.ndarray) -> np.ndarray:
+        """ Decrypt autokey cipher indices, window being the len(key) letters
+            preceding them in the key stream
+        """
+        return alternating_row_sums(ciphertext_indices, window, len(self.alphabet))
+
+# Vigeneres of pool workers, one per alphabet, so that their key caches stay warm
+_worker_vigeneres: dict[str, Vigenere] = {}
+
+def _cipher_records(alphabet: str, records: list[tuple[str, str, bool]],
+                    decrypting: bool) -> list[str]:
+    """ Encrypt or decrypt a batch of (key, text, autokey) records in pool worker
+    """
+    if alphabet not in _worker_vigeneres:
+        vigenere = Vigenere()
+        vigenere.alphabet = alphabet
+        _worker_vigeneres[alphabet] = vigenere
+    vigenere = _worker_vigeneres[alphabet]
 
-            new_index: int = (letter_index - key_index) % len(self.alphabet)
-            plaintext += self.alphabet[new_index]
+    if decrypting:
+        return [vigenere.decrypt(key, text, autokey) for key, text, autokey in records]
 
-        return plaintext
+    return [vigenere.encrypt(key, text, autokey) for key, text, autokey in records]
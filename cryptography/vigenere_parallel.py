@@ -0,0 +1,207 @@
+""" Multi-core encryption of large files with repeating-key Vigenère.
+    Without autokey the key letter of every position only depends on
+    position % len(key), so the file can be cut into chunks that are
+    encrypted on separate cores, each starting from its own key offset.
+"""
+import mmap
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from vigenere import Vigenere
+
+# Set in every worker process by _init_worker
+_vigenere: Vigenere
+_key_indices: np.ndarray
+_shifted_codes: np.ndarray
+_passthrough: bool
+
+def parallel_encrypt_file(vigenere: Vigenere, key: str, input_path: str, output_path: str,
+                          processes: int = None, chunk_size: int = 1 << 23,
+                          passthrough = False) -> None:
+    """ Encrypt UTF-8 file to another file with repeating-key Vigenère,
+        chunk_size bytes per worker task. With passthrough, characters not in
+        the alphabet (spaces, newlines) are copied as they are
+    """
+    _parallel_file(vigenere, key, input_path, output_path, processes, chunk_size,
+                   passthrough, decrypting=False)
+
+def parallel_decrypt_file(vigenere: Vigenere, key: str, input_path: str, output_path: str,
+                          processes: int = None, chunk_size: int = 1 << 23,
+                          passthrough = False) -> None:
+    """ Decrypt UTF-8 file to another file with repeating-key Vigenère,
+        chunk_size bytes per worker task. With passthrough, characters not in
+        the alphabet (spaces, newlines) are copied as they are
+    """
+    _parallel_file(vigenere, key, input_path, output_path, processes, chunk_size,
+                   passthrough, decrypting=True)
+
+def _parallel_file(vigenere: Vigenere, key: str, input_path: str, output_path: str,
+                   processes: int, chunk_size: int, passthrough: bool,
+                   decrypting: bool) -> None:
+    """ Run the file through the cipher in two passes over the chunks: count
+        letters to get each chunk's key offset, then encrypt every chunk once
+        into its own part file next to the output, and join the parts together.
+        Only letters of the alphabet use up the key, as in Vigenere.encrypt_file
+    """
+    key_indices = vigenere.compile_key(key)
+    if len(key_indices) == 0:
+        raise ValueError("Key must not be empty")
+
+    if os.path.getsize(input_path) == 0:
+        open(output_path, "wb").close()
+        return
+
+    boundaries = _chunk_boundaries(input_path, chunk_size)
+    chunks = list(zip(boundaries[:-1], boundaries[1:]))
+    parts = [f"{output_path}.part{index}" for index in range(len(chunks))]
+
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(vigenere.alphabet, key_indices,
+                                           passthrough)) as pool:
+            starts, ends = zip(*chunks)
+            paths = [input_path] * len(chunks)
+
+            letter_counts = list(pool.map(_count_letters, paths, starts, ends))
+            key_offsets = np.concatenate(([0], np.cumsum(letter_counts)[:-1])) % len(key_indices)
+            key_offsets = key_offsets.tolist()
+            signs = [-1 if decrypting else 1] * len(chunks)
+
+            written = list(pool.map(_write_chunk, paths, starts, ends, key_offsets, signs,
+                                    parts))
+            if written != letter_counts:
+                # Upper-casing changed the number of letters somewhere (ß to SS),
+                # so the key offsets after it were off
+                key_offsets = np.concatenate(([0], np.cumsum(written)[:-1])) % len(key_indices)
+                list(pool.map(_write_chunk, paths, starts, ends, key_offsets.tolist(), signs,
+                              parts))
+
+        with open(output_path, "wb", buffering=0) as output_file:
+            for part in parts:
+                _append_file(output_file, part)
+    finally:
+        for part in parts:
+            if os.path.exists(part):
+                os.remove(part)
+
+def _append_file(output_file, path: str) -> None:
+    """ Append file at path to the end of unbuffered output_file, copying
+        inside the kernel where the system can
+    """
+    with open(path, "rb", buffering=0) as part:
+        remaining = os.fstat(part.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(part.fileno(), output_file.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except (AttributeError, OSError):
+            # No copy_file_range, or not between these file systems. The
+            # file positions are where copying got to
+            pass
+
+        shutil.copyfileobj(part, output_file)
+
+def _chunk_boundaries(path: str, chunk_size: int) -> list[int]:
+    """ Byte offsets splitting the file into chunks of about chunk_size bytes,
+        moved forward so that no UTF-8 character gets split in two
+    """
+    with open(path, "rb") as input_file, \
+         mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as input_map:
+        boundaries = [0]
+        for offset in range(chunk_size, len(input_map), chunk_size):
+            offset = max(offset, boundaries[-1])
+            # Skip UTF-8 continuation bytes, 10xxxxxx
+            while offset < len(input_map) and input_map[offset] & 0xC0 == 0x80:
+                offset += 1
+            if offset > boundaries[-1]:
+                boundaries.append(offset)
+
+        if boundaries[-1] < len(input_map):
+            boundaries.append(len(input_map))
+
+        return boundaries
+
+def _init_worker(alphabet: str, key_indices: np.ndarray, passthrough: bool) -> None:
+    """ Set up the cipher once per worker process
+    """
+    global _vigenere, _key_indices, _shifted_codes, _passthrough
+    _vigenere = Vigenere()
+    _vigenere.alphabet = alphabet
+    _key_indices = key_indices
+    _shifted_codes = np.tile(np.array([ord(letter) for letter in alphabet], dtype=np.uint32), 2)
+    _passthrough = passthrough
+
+def _read_chunk(path: str, start: int, end: int) -> tuple[np.ndarray, np.ndarray]:
+    """ Read chunk straight from the memory-mapped file, and look up its code
+        points' alphabet indices. Without passthrough, every character must be
+        a letter of the alphabet
+    """
+    with open(path, "rb") as input_file, \
+         mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as input_map:
+        text = _vigenere.normalize(input_map[start:end].decode("utf-8"))
+
+    codes, indices = _vigenere.lookup(text)
+    if not _passthrough:
+        Vigenere._check_letters(text, indices)
+
+    return codes, indices
+
+def _cipher_chunk(path: str, start: int, end: int, key_offset: int,
+                  sign: int) -> tuple[np.ndarray, int]:
+    """ Encrypt (sign 1) or decrypt (sign -1) chunk into output code points.
+        Returns them and the number of letters
+    """
+    codes, indices = _read_chunk(path, start, end)
+    if _passthrough:
+        letters = indices >= 0
+        indices = indices[letters]
+
+    key_stream = _vigenere.repeat_key(_key_indices, len(indices), key_offset)
+    if sign < 0:
+        key_stream = len(_vigenere.alphabet) - key_stream
+
+    # Index and key stream are both below the alphabet length, so the letter
+    # codes twice in a row take the place of the modulo
+    new_codes = _shifted_codes[indices + key_stream]
+    if not _passthrough:
+        return new_codes, len(indices)
+
+    codes = codes.copy()
+    codes[letters] = new_codes
+
+    return codes, len(indices)
+
+def _count_letters(path: str, start: int, end: int) -> int:
+    """ Number of alphabet letters in chunk, which is how far the chunk moves the key.
+        Without passthrough every character is a letter, so the characters are
+        counted from the UTF-8 bytes without decoding them
+    """
+    if _passthrough:
+        _, indices = _read_chunk(path, start, end)
+        return int(np.count_nonzero(indices >= 0))
+
+    with open(path, "rb") as input_file, \
+         mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) as input_map:
+        data = np.frombuffer(input_map, dtype=np.uint8, count=end - start, offset=start)
+        # Every character has one byte that isn't a continuation byte, 10xxxxxx
+        count = int(np.count_nonzero(data & 0xC0 != 0x80))
+        del data
+
+    return count
+
+def _write_chunk(path: str, start: int, end: int, key_offset: int, sign: int,
+                 part_path: str) -> int:
+    """ Write the chunk's output into its own part file. Returns the number of
+        letters the chunk moved the key
+    """
+    codes, letters = _cipher_chunk(path, start, end, key_offset, sign)
+
+    with open(part_path, "wb") as part_file:
+        part_file.write(codes.tobytes().decode("utf-32-le").encode("utf-8"))
+
+    return letters
@@ -1,193 +1,835 @@
+from collections import OrderedDict
+from collections.abc import Iterable
+from contextlib import contextmanager
+import functools
+from itertools import groupby
 import os
 import sqlite3
 
 db_path = "courses.db"
 
-# Delete db for debugging
-if os.path.exists(db_path):
-    os.remove(db_path)
+# How many report results every database caches at most
+CACHE_SIZE = 1024
 
-db = sqlite3.connect(db_path)
-cur = db.cursor()
+class CoursesDB:
+    """ Courses database at path, or in memory with ":memory:". Nothing is
+        opened until the first query. Fresh deletes the database file first,
+        and pragmas like journal_mode = "WAL", synchronous = "NORMAL",
+        cache_size and mmap_size are set when the connection opens """
+
+    def __init__(self, path: str = db_path, fresh: bool = False, journal_mode: str = None,
+                 synchronous: str = None, cache_size: int = None, mmap_size: int = None,
+                 report_cache_size: int = CACHE_SIZE):
+        self.path = path
+        self.fresh = fresh
+        self.pragmas = {name: value for name, value in (
+            ("journal_mode", journal_mode), ("synchronous", synchronous),
+            ("cache_size", cache_size), ("mmap_size", mmap_size)) if value is not None}
+        self._connection: sqlite3.Connection = None
+        self._cursor: sqlite3.Cursor = None
+
+        # How many transaction blocks are open
+        self.transaction_depth = 0
+
+        # Report results as (function name, arguments) -> (table generations, result),
+        # least recently used first
+        self.report_cache_size = report_cache_size
+        self.cache: OrderedDict[tuple, tuple[tuple[int, ...], object]] = OrderedDict()
+        self.cache_stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0}
+
+        # Bumped on every write to the table, so results read before are known stale
+        self.table_generations: dict[str, int] = {}
+
+        # PRAGMA data_version and rows changed by the connection after the last
+        # write through writes(). Any other change leaves every result in doubt
+        self.known_changes: tuple[int, int] = None
+
+        # Whether the credits_per_year rollup is in use, None until checked
+        self.credit_rollups: bool = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """ Connection, opened on first use """
+
+        if self._connection is None:
+            if self.fresh and self.path != ":memory:":
+                for suffix in ("", "-wal", "-shm", "-journal"):
+                    if os.path.exists(self.path + suffix):
+                        os.remove(self.path + suffix)
+
+            self._connection = sqlite3.connect(self.path)
+            for name, value in self.pragmas.items():
+                self._connection.execute(f"PRAGMA {name} = {value};")
+
+        return self._connection
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        """ Cursor every query of the database goes through """
+
+        if self._cursor is None:
+            self._cursor = self.connection.cursor()
+
+        return self._cursor
+
+    def close(self) -> None:
+        """ Close the connection, the next query opens it again """
+
+        if self._connection is not None:
+            self._connection.close()
+        self._connection = None
+        self._cursor = None
+        self.fresh = False
+        self.cache.clear()
+        self.known_changes = None
+
+    def __getstate__(self) -> dict:
+        # Worker processes get the configuration and open their own connection
+        return {"path": self.path, "pragmas": self.pragmas,
+                "report_cache_size": self.report_cache_size}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["path"], report_cache_size=state["report_cache_size"])
+        self.pragmas = state["pragmas"]
+
+# Database the functions use, created on first use if not set
+_database: CoursesDB = None
+
+def use_database(database: CoursesDB) -> CoursesDB:
+    """ Make the functions use database """
+
+    global _database
+    _database = database
+
+    return database
+
+def database() -> CoursesDB:
+    """ Database the functions use, by default the one at db_path """
+
+    if _database is None:
+        use_database(CoursesDB(db_path))
+
+    return _database
+
+def __getattr__(name: str):
+    # db and cur of the current database, for code using them directly
+    if name == "db":
+        return database().connection
+    if name == "cur":
+        return database().cursor
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@contextmanager
+def transaction():
+    """ Commit the writes of the block together, or roll them all back on error.
+        Nested blocks are savepoints that roll back on their own """
+
+    courses_db = database()
+    cur = courses_db.cursor
+    savepoint = f"transaction_{courses_db.transaction_depth}"
+
+    cur.execute(f"SAVEPOINT {savepoint};")
+    courses_db.transaction_depth += 1
+    try:
+        yield
+    except BaseException:
+        cur.execute(f"ROLLBACK TO {savepoint};")
+        # Cached reports may have seen the writes rolled back
+        cache_clear()
+        raise
+    finally:
+        courses_db.transaction_depth -= 1
+        # Releasing the outermost savepoint commits
+        cur.execute(f"RELEASE {savepoint};")
+
+def _commit() -> None:
+    """ Commit, unless inside a transaction block which commits at its end """
+
+    if database().transaction_depth == 0:
+        database().connection.commit()
+
+#==== CACHE ====#
+
+def _changes() -> tuple[int, int]:
+    """ PRAGMA data_version, which changes when another connection commits, and
+        the rows changed by this connection so far """
+
+    connection = database().connection
+
+    return connection.execute("PRAGMA data_version;").fetchone()[0], connection.total_changes
+
+def _check_changes() -> None:
+    """ Forget every cached report, if the database changed other than through
+        writes(): by another connection or process, or through cur directly """
+
+    courses_db = database()
+    changes = _changes()
+    if changes != courses_db.known_changes:
+        courses_db.cache.clear()
+        courses_db.known_changes = changes
+
+def _written(*tables: str) -> None:
+    """ Mark tables written to, invalidating results read from them """
+
+    courses_db = database()
+    generations = courses_db.table_generations
+    for table in tables:
+        generations[table] = generations.get(table, 0) + 1
+
+    courses_db.known_changes = _changes()
+
+def writes(*tables: str):
+    """ Mark tables written to by the function, so that only the results read
+        from them are invalidated """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            _check_changes()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _written(*tables)
+
+        return wrapper
+
+    return decorator
+
+def _shallow_copy(result):
+    """ New list or dict of the items of result, anything else being immutable """
+
+    if isinstance(result, (list, dict)):
+        return type(result)(result)
+
+    return result
+
+def cached(*tables: str, copy=_shallow_copy):
+    """ Cache results of a report reading tables, until one of them is written
+        to. Callers get copies made with copy, so they can't change the cached
+        result. The shallow copy is enough for lists of tuples and plain dicts """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            _check_changes()
+
+            courses_db = database()
+            cache, stats = courses_db.cache, courses_db.cache_stats
+
+            key = (function.__name__, args, tuple(sorted(kwargs.items())))
+            generations = tuple(courses_db.table_generations.get(table, 0) for table in tables)
+
+            entry = cache.get(key)
+            if entry is not None and entry[0] == generations:
+                stats["hits"] += 1
+                cache.move_to_end(key)
+                return copy(entry[1])
+
+            stats["misses"] += 1
+            if entry is not None:
+                stats["stale"] += 1
+
+            result = function(*args, **kwargs)
+            cache[key] = (generations, copy(result))
+            cache.move_to_end(key)
+            while len(cache) > courses_db.report_cache_size:
+                cache.popitem(last=False)
+                stats["evictions"] += 1
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+def cache_info() -> dict[str, int]:
+    """ Hits, misses, stale entries and evictions of the report cache """
+
+    courses_db = database()
+
+    return dict(courses_db.cache_stats, size=len(courses_db.cache),
+                max_size=courses_db.report_cache_size)
+
+def cache_clear() -> None:
+    """ Forget every cached report """
+
+    database().cache.clear()
+
+#==== SCHEMA ====#
+
+# Schema changes in order, migration i bringing the database to version i + 1.
+# The version is kept in PRAGMA user_version
+MIGRATIONS = [
+    # 1: Tables
+    [
+        """--sql
+            CREATE TABLE IF NOT EXISTS teachers (
+                id INTEGER PRIMARY KEY,
+                name TEXT
+            );
+        """,
+        """--sql
+            CREATE TABLE IF NOT EXISTS students (
+                id INTEGER PRIMARY KEY,
+                name TEXT
+            );
+        """,
+        """--sql
+            CREATE TABLE IF NOT EXISTS courses (
+                id INTEGER PRIMARY KEY,
+                name TEXT,
+                credits INTEGER
+            );
+        """,
+        """--sql
+            CREATE TABLE IF NOT EXISTS course_teachers (
+                id INTEGER PRIMARY KEY,
+                course_id INTEGER REFERENCES courses(id),
+                teacher_id INTEGER REFERENCES teachers(id)
+            );
+        """,
+        """--sql
+            CREATE TABLE IF NOT EXISTS accomplishments (
+                id INTEGER PRIMARY KEY,
+                student_id INTEGER REFERENCES students(id),
+                course_id INTEGER REFERENCES courses(id),
+                date DATE,
+                grade INTEGER
+            );
+        """,
+        """--sql
+            CREATE TABLE IF NOT EXISTS groups (
+                id INTEGER PRIMARY KEY,
+                name TEXT
+            );
+        """,
+        """--sql
+            CREATE TABLE IF NOT EXISTS group_students (
+                id INTEGER PRIMARY KEY,
+                group_id INTEGER REFERENCES groups(id),
+                student_id INTEGER REFERENCES students(id)
+            );
+        """,
+        """--sql
+            CREATE TABLE IF NOT EXISTS group_teachers (
+                id INTEGER PRIMARY KEY,
+                group_id INTEGER REFERENCES groups (id),
+                teacher_id INTEGER REFERENCES teachers(id)
+            );
+        """,
+    ],
+    # 2: Indexes on names and foreign keys
+    [
+        "CREATE INDEX IF NOT EXISTS teachers_name ON teachers (name);",
+        "CREATE INDEX IF NOT EXISTS students_name ON students (name);",
+        "CREATE INDEX IF NOT EXISTS courses_name ON courses (name);",
+        "CREATE INDEX IF NOT EXISTS groups_name ON groups (name);",
+        "CREATE INDEX IF NOT EXISTS course_teachers_course_id ON course_teachers (course_id);",
+        "CREATE INDEX IF NOT EXISTS course_teachers_teacher_id ON course_teachers (teacher_id);",
+        "CREATE INDEX IF NOT EXISTS accomplishments_student_id ON accomplishments (student_id);",
+        "CREATE INDEX IF NOT EXISTS accomplishments_course_id ON accomplishments (course_id);",
+        "CREATE INDEX IF NOT EXISTS group_students_group_id ON group_students (group_id, student_id);",
+        "CREATE INDEX IF NOT EXISTS group_students_student_id ON group_students (student_id);",
+        "CREATE INDEX IF NOT EXISTS group_teachers_group_id ON group_teachers (group_id, teacher_id);",
+        "CREATE INDEX IF NOT EXISTS group_teachers_teacher_id ON group_teachers (teacher_id);",
+    ],
+    # 3: Index for date ranges, covering the course for credits
+    [
+        "CREATE INDEX IF NOT EXISTS accomplishments_date ON accomplishments (date, course_id);",
+    ],
+]
+
+def schema_version() -> int:
+    """ Version of the database schema """
+
+    cur = database().cursor
+
+    return cur.execute("PRAGMA user_version;").fetchone()[0]
+
+def migrate(version: int = None) -> int:
+    """ Migrate the database up to version, the latest by default. Every
+        migration commits with its version on its own """
+
+    cur = database().cursor
+
+    if version is None:
+        version = len(MIGRATIONS)
+
+    current = schema_version()
+    if not current <= version <= len(MIGRATIONS):
+        raise ValueError(f"Can't migrate from version {current} to {version}")
+
+    for number in range(current + 1, version + 1):
+        with transaction():
+            for statement in MIGRATIONS[number - 1]:
+                cur.execute(statement)
+            cur.execute(f"PRAGMA user_version = {number};")
+        cache_clear()
+
+    return version
+
+# Yearly credit totals, kept up to date by triggers when enabled
+CREDIT_ROLLUPS = [
+    """--sql
+        CREATE TABLE IF NOT EXISTS credits_per_year (
+            year INTEGER PRIMARY KEY,
+            credits INTEGER NOT NULL
+        );
+    """,
+    """--sql
+        CREATE TRIGGER IF NOT EXISTS credits_per_year_insert
+        AFTER INSERT ON accomplishments
+        WHEN STRFTIME("%Y", NEW.date) IS NOT NULL
+        BEGIN
+            INSERT INTO credits_per_year (year, credits)
+            VALUES (CAST(STRFTIME("%Y", NEW.date) AS INTEGER),
+                    IFNULL((SELECT credits FROM courses WHERE id = NEW.course_id), 0))
+            ON CONFLICT (year) DO UPDATE SET credits = credits + excluded.credits;
+        END;
+    """,
+    """--sql
+        CREATE TRIGGER IF NOT EXISTS credits_per_year_delete
+        AFTER DELETE ON accomplishments
+        WHEN STRFTIME("%Y", OLD.date) IS NOT NULL
+        BEGIN
+            UPDATE credits_per_year
+            SET credits = credits - IFNULL((SELECT credits FROM courses WHERE id = OLD.course_id), 0)
+            WHERE year = CAST(STRFTIME("%Y", OLD.date) AS INTEGER);
+        END;
+    """,
+    """--sql
+        CREATE TRIGGER IF NOT EXISTS credits_per_year_update
+        AFTER UPDATE OF date, course_id ON accomplishments
+        BEGIN
+            UPDATE credits_per_year
+            SET credits = credits - IFNULL((SELECT credits FROM courses WHERE id = OLD.course_id), 0)
+            WHERE year = CAST(STRFTIME("%Y", OLD.date) AS INTEGER);
+
+            INSERT INTO credits_per_year (year, credits)
+            SELECT CAST(STRFTIME("%Y", NEW.date) AS INTEGER),
+                   IFNULL((SELECT credits FROM courses WHERE id = NEW.course_id), 0)
+            WHERE STRFTIME("%Y", NEW.date) IS NOT NULL
+            ON CONFLICT (year) DO UPDATE SET credits = credits + excluded.credits;
+        END;
+    """,
+    """--sql
+        CREATE TRIGGER IF NOT EXISTS credits_per_year_course_update
+        AFTER UPDATE OF credits ON courses
+        BEGIN
+            UPDATE credits_per_year
+            SET credits = credits + (IFNULL(NEW.credits, 0) - IFNULL(OLD.credits, 0)) * (
+                SELECT COUNT(*) FROM accomplishments A
+                WHERE A.course_id = NEW.id
+                AND CAST(STRFTIME("%Y", A.date) AS INTEGER) = credits_per_year.year
+            );
+        END;
+    """,
+    """--sql
+        CREATE TRIGGER IF NOT EXISTS credits_per_year_course_insert
+        AFTER INSERT ON courses
+        BEGIN
+            INSERT INTO credits_per_year (year, credits)
+            SELECT CAST(STRFTIME("%Y", A.date) AS INTEGER), IFNULL(NEW.credits, 0) * COUNT(*)
+            FROM accomplishments A
+            WHERE A.course_id = NEW.id AND STRFTIME("%Y", A.date) IS NOT NULL
+            GROUP BY 1
+            ON CONFLICT (year) DO UPDATE SET credits = credits + excluded.credits;
+        END;
+    """,
+    """--sql
+        CREATE TRIGGER IF NOT EXISTS credits_per_year_course_delete
+        AFTER DELETE ON courses
+        BEGIN
+            UPDATE credits_per_year
+            SET credits = credits - IFNULL(OLD.credits, 0) * (
+                SELECT COUNT(*) FROM accomplishments A
+                WHERE A.course_id = OLD.id
+                AND CAST(STRFTIME("%Y", A.date) AS INTEGER) = credits_per_year.year
+            );
+        END;
+    """,
+]
+
+def enable_credit_rollups() -> None:
+    """ Keep yearly credit totals in credits_per_year, filling it from the
+        accomplishments so far, so that credits_by_year is a single lookup """
+
+    cur = database().cursor
+
+    with transaction():
+        for statement in CREDIT_ROLLUPS:
+            cur.execute(statement)
+
+        cur.execute("DELETE FROM credits_per_year;")
+        cur.execute("""--sql
+            INSERT INTO credits_per_year (year, credits)
+            SELECT CAST(STRFTIME("%Y", A.date) AS INTEGER), IFNULL(SUM(C.credits), 0) FROM
+            accomplishments A JOIN courses C ON C.id = A.course_id
+            WHERE STRFTIME("%Y", A.date) IS NOT NULL
+            GROUP BY 1;
+        """)
+
+    database().credit_rollups = True
+    # credits_by_year reads the totals from now on
+    cache_clear()
+
+def disable_credit_rollups() -> None:
+    """ Drop the yearly credit totals and their triggers """
+
+    cur = database().cursor
+
+    with transaction():
+        for trigger in ("insert", "delete", "update", "course_update", "course_insert",
+                        "course_delete"):
+            cur.execute(f"DROP TRIGGER IF EXISTS credits_per_year_{trigger};")
+        cur.execute("DROP TABLE IF EXISTS credits_per_year;")
+
+    database().credit_rollups = False
+    cache_clear()
+
+def credit_rollups_enabled() -> bool:
+    """ Whether credits_per_year is kept up to date """
+
+    courses_db = database()
+    if courses_db.credit_rollups is None:
+        res = courses_db.cursor.execute("""--sql
+            SELECT COUNT(*) FROM sqlite_master
+            WHERE type = 'trigger' AND name = 'credits_per_year_insert';
+        """)
+        courses_db.credit_rollups = res.fetchone()[0] > 0
+
+    return courses_db.credit_rollups
 
 def create_tables() -> None:
     """ Create neccessary tables """
 
-    cur.execute("""--sql
-        CREATE TABLE teachers (
-            id INTEGER PRIMARY KEY,
-            name TEXT
-        );
-    """)
-    cur.execute("""--sql
-        CREATE TABLE students (
-            id INTEGER PRIMARY KEY,
-            name TEXT
-        );
-    """)
-    cur.execute("""--sql
-        CREATE TABLE courses (
-            id INTEGER PRIMARY KEY,
-            name TEXT,
-            credits INTEGER
-        );
-    """)
-    cur.execute("""--sql
-        CREATE TABLE course_teachers (
-            id INTEGER PRIMARY KEY,
-            course_id INTEGER REFERENCES courses(id),
-            teacher_id INTEGER REFERENCES teachers(id)
-        );
-    """)
-    cur.execute("""--sql
-        CREATE TABLE accomplishments (
-            id INTEGER PRIMARY KEY,
-            student_id INTEGER REFERENCES students(id),
-            course_id INTEGER REFERENCES courses(id),
-            date DATE,
-            grade INTEGER
-        );
-    """)
-    cur.execute("""--sql
-        CREATE TABLE groups (
-            id INTEGER PRIMARY KEY,
-            name TEXT
-        );
-    """)
-    cur.execute("""--sql
-        CREATE TABLE group_students (
-            id INTEGER PRIMARY KEY,
-            group_id INTEGER REFERENCES groups(id),
-            student_id INTEGER REFERENCES students(id)
-        );
-    """)
-    cur.execute("""--sql
-        CREATE TABLE group_teachers (
-            id INTEGER PRIMARY KEY,
-            group_id INTEGER REFERENCES groups (id),
-            teacher_id INTEGER REFERENCES teachers(id)
-        );
-    """)
+    migrate()
 
+@writes("teachers")
 def create_teacher(name: str) -> int:
     """ Add teacher """
 
+    cur = database().cursor
+
     cur.execute("""--sql
         INSERT INTO teachers (name)
         VALUES (?);
     """, (name,))
 
-    db.commit()
+    _commit()
 
-    res = cur.execute("""--sql
-        SELECT MAX(id) FROM teachers
-        WHERE name = ?;
-    """, (name,))
-
-    return int(res.fetchone()[0])
+    return cur.lastrowid
 
+@writes("courses", "course_teachers")
 def create_course(name: str, credits: int, teacher_ids: list[int]) -> int:
     """ Add course """
 
+    cur = database().cursor
+
     cur.execute("""--sql
         INSERT INTO courses (name, credits)
         VALUES (?, ?)
     """, (name, credits))
 
-    res = cur.execute("""--sql
-        SELECT MAX(id) FROM courses
-        WHERE name = ?;
-    """, (name,))
-    
-    course_id = res.fetchone()[0]
-    
-    for teacher_id in teacher_ids:
-        cur.execute("""--sql
-            INSERT INTO course_teachers (course_id, teacher_id)
-            VALUES (?, ?)
-        """, (course_id, teacher_id))
-    
-    db.commit()
+    course_id = cur.lastrowid
+
+    cur.executemany("""--sql
+        INSERT INTO course_teachers (course_id, teacher_id)
+        VALUES (?, ?)
+    """, ((course_id, teacher_id) for teacher_id in teacher_ids))
+
+    _commit()
 
     return int(course_id)
 
+@writes("students")
 def create_student(name: str) -> int:
     """ Add student """
 
+    cur = database().cursor
+
     cur.execute("""--sql
         INSERT INTO students (name)
         VALUES (?);
     """, (name,))
 
-    db.commit()
-
-    res = cur.execute("""--sql
-        SELECT MAX(id) FROM students
-        WHERE name = ?;
-    """, (name,))
+    _commit()
 
-    return int(res.fetchone()[0])
+    return cur.lastrowid
 
+@writes("accomplishments")
 def add_credits(student_id: int, course_id: int, date: str, grade: int) -> int:
     """ Add credits """
 
+    cur = database().cursor
+
     cur.execute("""--sql
         INSERT INTO accomplishments (student_id, course_id, date, grade)
         VALUES (?, ?, ?, ?);
     """, (student_id, course_id, date, grade))
 
-    db.commit()
-
-    res = cur.execute("""--sql
-        SELECT MAX(id) FROM accomplishments
-        WHERE student_id == ?;
-    """, (student_id,))
+    _commit()
 
-    return res.fetchone()[0]
+    return cur.lastrowid
 
+@writes("groups", "group_teachers", "group_students")
 def create_group(name: str, teacher_ids: list[int], student_ids: list[int]) -> int:
     """ Add group """
+
+    cur = database().cursor
+
     cur.execute("""--sql
         INSERT INTO groups (name)
         VALUES (?)
     """, (name,))
 
-    res = cur.execute("""--sql
-        SELECT MAX(id) FROM groups
-        WHERE name = ?;
-    """, (name,))
-    
-    group_id = res.fetchone()[0]
-    
-    for teacher_id in teacher_ids:
-        cur.execute("""--sql
-            INSERT INTO group_teachers (group_id, teacher_id)
-            VALUES (?, ?)
-        """, (group_id, teacher_id))
+    group_id = cur.lastrowid
 
-    for student_id in student_ids:
-        cur.execute("""--sql
-            INSERT INTO group_students (group_id, student_id)
-            VALUES (?, ?)
-        """, (group_id, student_id))
+    cur.executemany("""--sql
+        INSERT INTO group_teachers (group_id, teacher_id)
+        VALUES (?, ?)
+    """, ((group_id, teacher_id) for teacher_id in teacher_ids))
 
-    db.commit()
+    cur.executemany("""--sql
+        INSERT INTO group_students (group_id, student_id)
+        VALUES (?, ?)
+    """, ((group_id, student_id) for student_id in student_ids))
+
+    _commit()
 
     return group_id
 
+#==== BULK LOAD ====#
+
+def _inserted_ids(table: str) -> list[int]:
+    """ Ids of the rows just inserted into table by executemany. Without explicit
+        ids SQLite gives every new row MAX(id) + 1, and the insert holds the write
+        lock until commit, so the ids are the last rowcount ids of the table
+    """
+    cur = database().cursor
+    count = cur.rowcount
+    last_id = cur.execute(f"SELECT IFNULL(MAX(id), 0) FROM {table};").fetchone()[0]
+
+    return list(range(last_id - count + 1, last_id + 1))
+
+@writes("teachers")
+def bulk_create_teachers(names: Iterable[str]) -> list[int]:
+    """ Add teachers in one transaction """
+
+    cur = database().cursor
+
+    with transaction():
+        cur.executemany("""--sql
+            INSERT INTO teachers (name)
+            VALUES (?);
+        """, ((name,) for name in names))
+
+        return _inserted_ids("teachers")
+
+@writes("students")
+def bulk_create_students(names: Iterable[str]) -> list[int]:
+    """ Add students in one transaction """
+
+    cur = database().cursor
+
+    with transaction():
+        cur.executemany("""--sql
+            INSERT INTO students (name)
+            VALUES (?);
+        """, ((name,) for name in names))
+
+        return _inserted_ids("students")
+
+@writes("accomplishments")
+def bulk_add_credits(credits: Iterable[tuple[int, int, str, int]]) -> list[int]:
+    """ Add (student_id, course_id, date, grade) credits in one transaction """
+
+    cur = database().cursor
+
+    with transaction():
+        cur.executemany("""--sql
+            INSERT INTO accomplishments (student_id, course_id, date, grade)
+            VALUES (?, ?, ?, ?);
+        """, credits)
+
+        return _inserted_ids("accomplishments")
+
+@writes("groups", "group_teachers", "group_students")
+def bulk_create_groups(groups: Iterable[tuple[str, list[int], list[int]]]) -> list[int]:
+    """ Add (name, teacher_ids, student_ids) groups in one transaction """
+
+    cur = database().cursor
+
+    groups = list(groups)
+
+    with transaction():
+        cur.executemany("""--sql
+            INSERT INTO groups (name)
+            VALUES (?);
+        """, ((name,) for name, _, _ in groups))
+        group_ids = _inserted_ids("groups")
+
+        cur.executemany("""--sql
+            INSERT INTO group_teachers (group_id, teacher_id)
+            VALUES (?, ?);
+        """, ((group_id, teacher_id) for group_id, (_, teacher_ids, _) in zip(group_ids, groups)
+              for teacher_id in teacher_ids))
+
+        cur.executemany("""--sql
+            INSERT INTO group_students (group_id, student_id)
+            VALUES (?, ?);
+        """, ((group_id, student_id) for group_id, (_, _, student_ids) in zip(group_ids, groups)
+              for student_id in student_ids))
+
+    return group_ids
+
+#==== REPORT QUERIES ====#
+
+COURSES_BY_TEACHER_QUERY = """--sql
+    SELECT C.name FROM
+    course_teachers CT JOIN courses C ON C.id = CT.course_id
+                       JOIN teachers T ON T.id = CT.teacher_id
+    WHERE T.name = ?
+    ORDER BY T.name;
+"""
+
+CREDITS_BY_TEACHER_QUERY = """--sql
+    SELECT SUM(C.credits) FROM
+    course_teachers CT JOIN courses C ON C.id = CT.course_id
+                       JOIN teachers T ON T.id = CT.teacher_id
+                       JOIN accomplishments A ON A.course_id = CT.course_id
+    WHERE T.name = ?;
+"""
+
+COURSES_BY_STUDENT_QUERY = """--sql
+    SELECT C.name, A.grade  FROM
+    accomplishments A JOIN courses C ON C.id = A.course_id
+                      JOIN students S ON S.id = A.student_id
+    WHERE S.name = ?
+    ORDER BY C.name;
+"""
+
+CREDITS_BY_YEAR_QUERY = """--sql
+    SELECT IFNULL(SUM(C.credits),0) FROM
+    courses C JOIN accomplishments A ON C.id = A.course_id
+    WHERE A.date >= ? AND A.date < ?;
+"""
+
+CREDITS_PER_YEAR_QUERY = """--sql
+    SELECT credits FROM credits_per_year
+    WHERE year = ?;
+"""
+
+GRADE_DISTRIBUTION_QUERY = """--sql
+    SELECT A.grade, COUNT(A.grade) FROM
+    courses C JOIN accomplishments A ON C.id = A.course_id
+    WHERE C.name = ?
+    GROUP BY A.grade
+    ORDER BY A.grade;
+"""
+
+COURSE_LIST_QUERY = """--sql
+    SELECT C.name, COUNT(DISTINCT CT.teacher_id), COUNT(DISTINCT A.student_id) FROM
+    courses C LEFT JOIN course_teachers CT ON C.id = CT.course_id
+              LEFT JOIN accomplishments A ON C.id = A.course_id
+    GROUP BY C.name
+    ORDER BY C.name;
+"""
+
+TEACHER_LIST_QUERY = """--sql
+    SELECT T.id, T.name, C.name FROM
+    teachers T LEFT JOIN course_teachers CT ON T.id = CT.teacher_id
+               LEFT JOIN courses C ON C.id = CT.course_id
+    ORDER BY T.name, T.id, CT.id;
+"""
+
+GROUP_PEOPLE_QUERY = """--sql
+    SELECT S.name FROM
+    group_students GS JOIN groups G ON G.id = GS.group_id
+                      JOIN students S ON S.id = GS.student_id
+    WHERE G.name = ?
+    UNION ALL
+    SELECT T.name FROM
+    group_teachers GT JOIN groups G ON G.id = GT.group_id
+                      JOIN teachers T ON T.id = GT.teacher_id
+    WHERE G.name = ?
+    ORDER BY 1;
+"""
+
+CREDITS_IN_GROUPS_QUERY = """--sql
+    SELECT G.name, iFNULL(SUM(C.credits),0) FROM
+    groups G JOIN group_students GS ON G.id = GS.group_id
+             LEFT JOIN accomplishments A ON A.student_id = GS.student_id
+             LEFT JOIN courses C ON C.id = A.course_id
+    GROUP BY G.name
+    ORDER BY G.name ;
+"""
+
+COMMON_GROUPS_QUERY = """--sql
+    SELECT G.name FROM
+    groups G JOIN group_teachers GT ON G.id = GT.group_id
+             JOIN teachers T ON T.id = GT.teacher_id
+             JOIN group_students GS ON G.id = GS.group_id
+             JOIN students S ON S.id = GS.student_id
+    WHERE T.name = ? AND S.name = ?
+    ORDER BY G.name ;
+"""
+
+# Every report query with sample parameters, for checking query plans
+REPORT_QUERIES = {
+    "courses_by_teacher": (COURSES_BY_TEACHER_QUERY, ("",)),
+    "credits_by_teacher": (CREDITS_BY_TEACHER_QUERY, ("",)),
+    "courses_by_student": (COURSES_BY_STUDENT_QUERY, ("",)),
+    "credits_by_year": (CREDITS_BY_YEAR_QUERY, ("2000-01-01", "2001-01-01")),
+    "grade_distribution": (GRADE_DISTRIBUTION_QUERY, ("",)),
+    "course_list": (COURSE_LIST_QUERY, ()),
+    "teacher_list": (TEACHER_LIST_QUERY, ()),
+    "group_people": (GROUP_PEOPLE_QUERY, ("", "")),
+    "credits_in_groups": (CREDITS_IN_GROUPS_QUERY, ()),
+    "common_groups": (COMMON_GROUPS_QUERY, ("", "")),
+}
+
+def query_plans() -> dict[str, list[str]]:
+    """ EXPLAIN QUERY PLAN of every report query """
+
+    cur = database().cursor
+
+    plans = {}
+    for name, (query, parameters) in REPORT_QUERIES.items():
+        res = cur.execute("EXPLAIN QUERY PLAN " + query, parameters)
+        plans[name] = [row[3] for row in res.fetchall()]
+
+    return plans
+
+def verify_query_plans() -> dict[str, list[str]]:
+    """ Check that no report query scans a whole table without an index.
+        Reports of every row may scan in index order. Returns the plans """
+
+    plans = query_plans()
+
+    scans = []
+    for name, plan in plans.items():
+        for step in plan:
+            if step.startswith("SCAN ") and " USING " not in step \
+                    and step != "SCAN CONSTANT ROW":
+                scans.append(f"{name}: {step}")
+
+    if scans:
+        raise sqlite3.OperationalError("Queries scan tables: " + ", ".join(scans))
+
+    return plans
+
 #==== FETH DATA ====#
 
 
+@cached("course_teachers", "courses", "teachers")
 def courses_by_teacher(name: str) -> list[str]:
     """ Fetch courses """
 
-    res = cur.execute("""--sql
-        SELECT C.name FROM
-        course_teachers CT JOIN courses C ON C.id = CT.course_id
-                           JOIN teachers T ON T.id = CT.teacher_id
-        WHERE T.name = ?
-        ORDER BY T.name;
-    """, (name,))
+    cur = database().cursor
+
+    res = cur.execute(COURSES_BY_TEACHER_QUERY, (name,))
 
     courses = []
     for course in res.fetchall():
@@ -195,53 +837,50 @@ def courses_by_teacher(name: str) -> list[str]:
 
     return courses
 
+@cached("course_teachers", "courses", "teachers", "accomplishments")
 def credits_by_teacher(name: str) -> int:
     """ Fetch credits """
 
-    res = cur.execute("""--sql
-        SELECT SUM(C.credits) FROM
-        course_teachers CT JOIN courses C ON C.id = CT.course_id
-                           JOIN teachers T ON T.id = CT.teacher_id
-                           JOIN accomplishments A ON A.course_id = CT.course_id
-        WHERE T.name = ?;
-    """, (name,))
+    cur = database().cursor
+
+    res = cur.execute(CREDITS_BY_TEACHER_QUERY, (name,))
 
     return res.fetchone()[0]
 
+@cached("accomplishments", "courses", "students")
 def courses_by_student(name: str) -> list[tuple[str, int]]:
     """ Fetch courses """
 
-    res = cur.execute("""--sql
-        SELECT C.name, A.grade  FROM
-        accomplishments A JOIN courses C ON C.id = A.course_id
-                          JOIN students S ON S.id = A.student_id
-        WHERE S.name = ?
-        ORDER BY C.name;
-    """, (name,))
+    cur = database().cursor
+
+    res = cur.execute(COURSES_BY_STUDENT_QUERY, (name,))
 
     return res.fetchall()
 
+@cached("courses", "accomplishments")
 def credits_by_year(year: int) -> int:
     """ Fetch credits (agan) """
 
-    res = cur.execute("""--sql
-        SELECT IFNULL(SUM(C.credits),0) FROM
-        courses C JOIN accomplishments A ON C.id = A.course_id
-        WHERE (SELECT STRFTIME("%Y", A.date)) = ?;
-    """, (str(year),))
+    cur = database().cursor
+
+    if credit_rollups_enabled():
+        res = cur.execute(CREDITS_PER_YEAR_QUERY, (year,))
+        row = res.fetchone()
+
+        return row[0] if row is not None else 0
+
+    # Comparing the dates themselves can use the date index
+    res = cur.execute(CREDITS_BY_YEAR_QUERY, (f"{year:04d}-01-01", f"{year + 1:04d}-01-01"))
 
     return res.fetchone()[0]
 
+@cached("courses", "accomplishments")
 def grade_distribution(course_name: str) -> dict[int:int]:
     """ Fetch distribution """
 
-    res = cur.execute("""--sql
-        SELECT A.grade, COUNT(A.grade) FROM
-        courses C JOIN accomplishments A ON C.id = A.course_id
-        WHERE C.name = ?
-        GROUP BY A.grade
-        ORDER BY A.grade;
-    """, (course_name,))
+    cur = database().cursor
+
+    res = cur.execute(GRADE_DISTRIBUTION_QUERY, (course_name,))
 
     distribution = dict(res.fetchall())
     for i in range(1, 6):
@@ -250,109 +889,72 @@ def grade_distribution(course_name: str) -> dict[int:int]:
 
     return dict(sorted(distribution.items()))
 
+@cached("courses", "course_teachers", "accomplishments")
 def course_list() -> list[tuple[str, int, int]]:
     """ Fetch courses """
-    
-    res = cur.execute("""--sql
-        SELECT C.name, COUNT(DISTINCT CT.teacher_id), COUNT(DISTINCT A.student_id) FROM
-        courses C LEFT JOIN course_teachers CT ON C.id = CT.course_id
-                  LEFT JOIN accomplishments A ON C.id = A.course_id
-        GROUP BY C.name
-        ORDER BY C.name;
-    """)
+
+    cur = database().cursor
+
+    res = cur.execute(COURSE_LIST_QUERY)
 
     return res.fetchall()
 
+@cached("teachers", "course_teachers", "courses",
+        copy=lambda teachers: [(teacher, list(courses)) for teacher, courses in teachers])
 def teacher_list() -> list[tuple[str, list[str]]]:
     """ Fetch teachers """
 
-    res = cur.execute("""--sql
-        SELECT name FROM teachers
-        ORDER BY name;
-    """)
-
-    teachers = res.fetchall()
-    teachers_courses = []
-
-    for teacher in teachers:
-        res = cur.execute("""--sql
-            SELECT C.name FROM
-            course_teachers CT JOIN teachers T ON T.id = CT.teacher_id
-                               JOIN courses C ON C.id = CT.course_id
-            WHERE T.name = ?;
-        """, (teacher[0],))
+    cur = database().cursor
 
-        courses = []
-        for course in res.fetchall():
-            courses.append(course[0])
+    res = cur.execute(TEACHER_LIST_QUERY)
 
-        teachers_courses.append((teacher[0], courses))
+    teachers_courses = []
+    for (_, teacher), rows in groupby(res, key=lambda row: row[:2]):
+        courses = [course for _, _, course in rows if course is not None]
+        teachers_courses.append((teacher, courses))
 
     return teachers_courses
 
+@cached("groups", "group_students", "students", "group_teachers", "teachers")
 def group_people(group: str) -> list[str]:
     """ Fetch people """
 
-    res = cur.execute("""--sql
-        SELECT S.name FROM
-        group_students GS JOIN groups G ON G.id = GS.group_id
-                          JOIN students S ON S.id = GS.student_id
-        WHERE G.name = ?;
-    """, (group,))
-
-    people = []
-    for student in res.fetchall():
-        people.append(student[0])
+    cur = database().cursor
 
-    res = cur.execute("""--sql
-        SELECT T.name FROM
-        group_teachers GT JOIN groups G ON G.id = GT.group_id
-                          JOIN teachers T ON T.id = GT.teacher_id
-        WHERE G.name = ?;
-    """, (group,))
+    res = cur.execute(GROUP_PEOPLE_QUERY, (group, group))
 
-    for teacher in res.fetchall():
-        people.append(teacher[0])
-
-    return sorted(people)
+    return [person[0] for person in res]
 
+@cached("groups", "group_students", "accomplishments", "courses")
 def credits_in_groups() -> list[tuple[str, int]]:
     """ Fetch credits """
 
-    res = cur.execute("""--sql
-        SELECT G.name, iFNULL(SUM(C.credits),0) FROM
-        group_students GS LEFT JOIN accomplishments A ON A.student_id = GS.student_id
-                          LEFT JOIN courses C ON C.id = A.course_id
-                          LEFT JOIN groups G ON G.id = GS.group_id
-        GROUP BY G.name
-        ORDER BY G.name ;
-    """)
+    cur = database().cursor
+
+    res = cur.execute(CREDITS_IN_GROUPS_QUERY)
 
     return res.fetchall()
 
+@cached("groups", "group_teachers", "teachers", "group_students", "students")
 def common_groups(teacher_name, student_name) -> list[str]:
     """ Fetch groups """
 
-    res = cur.execute("""--sql
-        SELECT G.name FROM
-        groups G JOIN group_teachers GT ON G.id = GT.group_id
-                 JOIN teachers T ON T.id = GT.teacher_id
-                 JOIN group_students GS ON G.id = GS.group_id
-                 JOIN students S ON S.id = GS.student_id
-        WHERE T.name = ? AND S.name = ?
-        ORDER BY G.name ;                  
-    """, (teacher_name, student_name))
+    cur = database().cursor
+
+    res = cur.execute(COMMON_GROUPS_QUERY, (teacher_name, student_name))
 
     groups = []
     for group in res.fetchall():
         groups.append(group[0])
-    
+
     return groups
 
 #==== DEBUG ====#
 
 if __name__ == "__main__":
-    
+
+    # Start from an empty database for debugging
+    use_database(CoursesDB(db_path, fresh=True))
     create_tables()
 
     t1 = create_teacher("Erkki Kaila")